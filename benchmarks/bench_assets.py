@@ -0,0 +1,60 @@
+# Startup cost of the piece sprites: building the atlas cache, loading with a warm cache and drawing the first frame's pieces,
+# with the shipped images and with synthetic per class variants (copies of the piece images named like wN_variant3),
+# the first frame only draws the standard pieces so its cost should stay flat however many variants exist
+# usage (from the repository root): python -m benchmarks.bench_assets [repeats]
+import os
+import shutil
+import sys
+import tempfile
+import time
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy") # no window needed
+import pygame
+from rpg_chess.Data.constants import *
+from rpg_chess.View import assets
+
+VARIANTS = (0, 8, 64) # synthetic variants per piece
+
+def time_atlas(clear_cache, images_dir = assets.IMAGES_DIR, cache_dir = assets.CACHE_DIR):
+    if clear_cache and os.path.isdir(cache_dir):
+        for file_name in os.listdir(cache_dir):
+            os.remove(os.path.join(cache_dir, file_name))
+    start = time.perf_counter()
+    atlas = assets.SpriteAtlas(images_dir=images_dir, cache_dir=cache_dir)
+    loaded = time.perf_counter()
+    for piece in PIECE_NAMES: # everything the start position shows
+        atlas[piece]
+    first_frame = time.perf_counter()
+    pages = sum(page is not None for page in atlas.pages)
+    return loaded - start, first_frame - start, len(atlas.names), pages
+
+# a copy of images/ with variants extra copies of every piece image, names sort between the standard pieces
+def make_images_dir(directory, variants):
+    for piece in PIECE_NAMES:
+        source = os.path.join(assets.IMAGES_DIR, piece + ".png")
+        shutil.copyfile(source, os.path.join(directory, piece + ".png"))
+        for index in range(variants):
+            shutil.copyfile(source, os.path.join(directory, f"{piece}_variant{index}.png"))
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    pygame.init()
+    pygame.display.set_mode((WIDTH, HEIGHT))
+    for variants in VARIANTS:
+        with tempfile.TemporaryDirectory() as directory:
+            if variants:
+                make_images_dir(directory, variants)
+                images_dir, cache_dir = directory, os.path.join(directory, ".cache")
+            else: # the shipped images and the real cache
+                images_dir, cache_dir = assets.IMAGES_DIR, assets.CACHE_DIR
+            for label, clear_cache in (("cold cache", True), ("warm cache", False)):
+                best = None
+                for _ in range(repeats):
+                    result = time_atlas(clear_cache, images_dir, cache_dir)
+                    best = result if best is None or result[1] < best[1] else best
+                load, first_frame, sprites, pages = best
+                print(f"{variants:3} variants {label:10} atlas {load * 1000:7.2f}ms  first frame sprites {first_frame * 1000:7.2f}ms  "
+                      f"{sprites} sprites, {pages} pages in memory")
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# Compare the list of strings backend with the bitboard backend of GameState
+# usage (from the repository root): python -m benchmarks.bench_backends [depth] [repeats]
+import sys
+import time
+from rpg_chess.Controller import chess_engine
+
+# start position and an open italian game with castling rights, pins and captures available
+POSITIONS = {
+    "start": [],
+    "italian": ["e2e4", "e7e5", "g1f3", "b8c6", "f1c4", "g8f6", "e1g1", "f8c5", "d2d3", "d7d6", "c1g5", "h7h6"],
+}
+
+def play_moves(gs, notations):
+    for notation in notations:
+        for move in gs.get_valid_moves():
+            if move.get_chess_notation() == notation:
+                gs.make_move(move)
+                break
+        else:
+            raise ValueError(f"Illegal move {notation}")
+
+def count_nodes(gs, depth):
+    moves = gs.get_valid_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        gs.make_move(move)
+        nodes += count_nodes(gs, depth - 1)
+        gs.undo_move()
+    return nodes
+
+def main():
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    print(f"depth {depth}, best of {repeats}")
+    for name, notations in POSITIONS.items():
+        times = {}
+        for backend in ("list", "bitboard"):
+            gs = chess_engine.GameState(backend, 0) # move cache off, only the generator is timed
+            play_moves(gs, notations)
+            best = None
+            for _ in range(repeats):
+                start = time.perf_counter()
+                nodes = count_nodes(gs, depth)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            times[backend] = best
+            print(f"{name:10} {backend:9} {nodes:10} nodes {best:8.3f}s {nodes / best:12.0f} nodes/s")
+        print(f"{name:10} bitboard speedup x{times['list'] / times['bitboard']:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Positions per second of the NumPy batch API against one GameState per position: encoding FENs or GameStates into
+# piece planes and evaluating them, the batch scores are checked against evaluation.evaluate
+# usage (from the repository root): python -m benchmarks.bench_batch [positions] [repeats]
+import random
+import sys
+import time
+from rpg_chess.Controller import batch
+from rpg_chess.Controller import chess_engine
+from rpg_chess.Controller import evaluation
+
+# positions from random games, every ply of every game, so openings, middlegames and endgames are all there
+def get_positions(count, seed = 0):
+    rng = random.Random(seed)
+    fens = []
+    while len(fens) < count:
+        gs = chess_engine.GameState("list", 0)
+        for _ in range(200):
+            moves = gs.get_valid_moves()
+            if not moves or len(fens) >= count:
+                break
+            gs.make_move(rng.choice(moves))
+            fens.append(gs.get_fen())
+    return fens
+
+def time_best(function, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def evaluate_one_by_one(fens):
+    return [evaluation.evaluate(chess_engine.GameState("list", 0, fen)) for fen in fens]
+
+def evaluate_fens(fens):
+    codes, features = batch.encode_fens(fens)
+    return batch.evaluate_codes(codes, features)
+
+def encode_fens(fens):
+    codes, features = batch.encode_fens(fens)
+    return batch.get_planes(codes), features
+
+def evaluate_game_states(states):
+    codes, features = batch.encode_game_states(states)
+    return batch.evaluate_codes(codes, features)
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    batch.require_numpy()
+    fens = get_positions(count)
+    states = [chess_engine.GameState("list", 0, fen) for fen in fens[:10000]]
+    print(f"{len(fens)} positions, best of {repeats}")
+
+    sample = fens[:10000] # one GameState per position is too slow for the whole set
+    expected, elapsed = time_best(lambda: evaluate_one_by_one(sample), 1)
+    print(f"{'GameState + evaluate':28} {len(sample) / elapsed:12.0f} positions/s")
+    scores, elapsed = time_best(lambda: evaluate_fens(fens), repeats)
+    print(f"{'batch FEN + evaluate':28} {len(fens) / elapsed:12.0f} positions/s")
+    if list(scores[:len(sample)]) != expected:
+        print("WRONG SCORES: the batch evaluation differs from evaluation.evaluate")
+    _, elapsed = time_best(lambda: encode_fens(fens), repeats)
+    print(f"{'batch FEN -> planes':28} {len(fens) / elapsed:12.0f} positions/s")
+    planes, features = encode_fens(fens)
+    plane_scores, elapsed = time_best(lambda: batch.evaluate_planes(planes, features), repeats)
+    print(f"{'evaluate planes':28} {len(fens) / elapsed:12.0f} positions/s")
+    if (plane_scores != scores).any():
+        print("WRONG SCORES: planes and codes evaluate differently")
+    state_scores, elapsed = time_best(lambda: evaluate_game_states(states), repeats)
+    print(f"{'batch GameState + evaluate':28} {len(states) / elapsed:12.0f} positions/s")
+    if list(state_scores) != [evaluation.evaluate(gs) for gs in states]:
+        print("WRONG SCORES: GameState encoding differs from evaluation.evaluate")
+
+if __name__ == "__main__":
+    main()
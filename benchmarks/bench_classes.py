@@ -0,0 +1,55 @@
+# Move generation with RPG piece classes: plain chess on the list backend, the classes backend with the plain classes
+# (node counts must match) and the classes backend with every class from piece_classes.json handed out to the pieces
+# usage (from the repository root): python -m benchmarks.bench_classes [depth] [repeats]
+import sys
+import time
+from rpg_chess.Controller import chess_engine
+from rpg_chess.Data import piece
+from benchmarks.bench_backends import POSITIONS, play_moves, count_nodes
+
+# every N, B, R and Q gets the next class of its type in turn
+def assign_classes(gs, classes):
+    by_type = {}
+    for piece_class in classes.values():
+        by_type.setdefault(piece_class.piece_type, []).append(piece_class)
+    handed_out = {}
+    for row in range(8):
+        for col in range(8):
+            piece_type = gs.board[row][col][1:]
+            if piece_type in by_type:
+                count = handed_out.get(piece_type, 0)
+                gs.assign_class(row, col, by_type[piece_type][count % len(by_type[piece_type])])
+                handed_out[piece_type] = count + 1
+
+def time_nodes(gs, depth, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        nodes = count_nodes(gs, depth)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return nodes, best
+
+def main():
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    classes = piece.load_piece_classes()
+    print(f"depth {depth}, best of {repeats}, classes: {', '.join(classes)}")
+    for name, notations in POSITIONS.items():
+        results = {}
+        for label, backend, custom in (("plain", "list", False), ("classes", "classes", False), ("custom", "classes", True)):
+            gs = chess_engine.GameState(backend, 0)
+            play_moves(gs, notations)
+            if custom:
+                assign_classes(gs, classes)
+            nodes, best = time_nodes(gs, depth, repeats)
+            results[label] = (nodes, best)
+            print(f"{name:10} {label:8} {nodes:10} nodes {best:8.3f}s {nodes / best:12.0f} nodes/s")
+        if results["classes"][0] != results["plain"][0]:
+            print(f"{name:10} WRONG COUNT: the plain classes must play plain chess")
+        plain_speed = results["plain"][0] / results["plain"][1]
+        print(f"{name:10} classes x{results['classes'][0] / results['classes'][1] / plain_speed:.2f}, "
+              f"custom x{results['custom'][0] / results['custom'][1] / plain_speed:.2f} of plain speed")
+
+if __name__ == "__main__":
+    main()
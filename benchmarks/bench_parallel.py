@@ -0,0 +1,43 @@
+# Scaling of the parallel root split search with the number of worker processes
+# usage (from the repository root): python -m benchmarks.bench_parallel [depth] [workers ...]
+# every position is searched to a fixed depth so the runs do the same work, the time to reach it is compared with 1 worker
+import os
+import sys
+import time
+from rpg_chess.Controller import chess_engine
+from rpg_chess.Controller import parallel_search
+
+POSITIONS = {
+    "start": "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "italian": "r1bqk2r/ppp2pp1/2np1n1p/2b1p1B1/2B1P3/3P1N2/PPP2PPP/RN1Q1RK1 w kq - 0 7",
+    "kiwipete": "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "endgame": "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+}
+
+def main():
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    cpus = os.cpu_count() or 1
+    worker_counts = [int(arg) for arg in sys.argv[2:]] or sorted({1, 2, 4, cpus})
+    print(f"depth {depth}, {cpus} cpus")
+    print(f"{'workers':>7} {'time':>8} {'nodes':>10} {'nodes/s':>10} {'speedup':>8}")
+    serial_time = None
+    for workers in worker_counts:
+        searcher = parallel_search.ParallelSearcher(workers, info=None)
+        try:
+            searcher.find_best_move(chess_engine.GameState(fen=POSITIONS["start"]), 1.0, 1) # start the worker processes
+            total_time = 0.0
+            total_nodes = 0
+            for name, fen in POSITIONS.items():
+                gs = chess_engine.GameState(fen=fen)
+                start = time.perf_counter()
+                searcher.find_best_move(gs, 3600.0, depth)
+                total_time += time.perf_counter() - start
+                total_nodes += searcher.nodes
+        finally:
+            searcher.close()
+        if serial_time is None:
+            serial_time = total_time
+        print(f"{workers:7} {total_time:8.2f} {total_nodes:10} {total_nodes / total_time:10.0f} {serial_time / total_time:8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# Load test of the game server: many clients play random games at once, request latency percentiles and games/s are reported
+# usage (from the repository root):
+#   python -m benchmarks.bench_server                          start a server on a free port and test it
+#   python -m benchmarks.bench_server --port 8765 --clients 200 --games 1000   test a running server
+import argparse
+import asyncio
+import json
+import random
+import socket
+import subprocess
+import sys
+import time
+
+class Client:
+    def __init__(self, reader, writer, latencies):
+        self.reader = reader
+        self.writer = writer
+        self.latencies = latencies
+
+    async def request(self, **request):
+        start = time.perf_counter()
+        self.writer.write(json.dumps(request).encode() + b"\n")
+        await self.writer.drain()
+        answer = json.loads(await self.reader.readline())
+        self.latencies.append(time.perf_counter() - start)
+        if not answer["ok"]:
+            raise RuntimeError(f"{request}: {answer['error']}")
+        return answer
+
+# plays random games until the shared counter of games runs out, returns the games played
+async def play(host, port, games_left, max_plies, search_every, rng, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    client = Client(reader, writer, latencies)
+    played = 0
+    try:
+        while games_left[0] > 0:
+            games_left[0] -= 1
+            answer = await client.request(op="new")
+            game = answer["game"]
+            status = answer["status"]
+            plies = 0
+            while status in ("playing", "check") and plies < max_plies:
+                if search_every and plies % search_every == search_every - 1:
+                    answer = await client.request(op="search", game=game, time=0.05, play=True)
+                else:
+                    moves = (await client.request(op="moves", game=game))["moves"]
+                    answer = await client.request(op="move", game=game, move=rng.choice(moves))
+                status = answer["status"]
+                plies += 1
+            await client.request(op="state", game=game)
+            await client.request(op="close", game=game)
+            played += 1
+    finally:
+        writer.close()
+    return played
+
+def get_percentile(sorted_values, fraction):
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+async def run(host, port, clients, games, max_plies, search_every, seed):
+    latencies = []
+    games_left = [games]
+    start = time.perf_counter()
+    played = await asyncio.gather(*(play(host, port, games_left, max_plies, search_every, random.Random(seed + index), latencies)
+                                    for index in range(clients)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(f"{clients} clients, {sum(played)} games, {len(latencies)} requests in {elapsed:.2f}s")
+    print(f"{sum(played) / elapsed:.2f} games/s, {len(latencies) / elapsed:.0f} requests/s")
+    print("latency ms: " + "  ".join(f"p{int(fraction * 100)} {get_percentile(latencies, fraction) * 1000:.2f}"
+                                     for fraction in (0.5, 0.9, 0.99)) + f"  max {latencies[-1] * 1000:.2f}")
+
+def get_free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for rpg_chess.Controller.server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="port of a running server, by default one is started for the test")
+    parser.add_argument("--clients", type=int, default=50, help="connections playing at the same time")
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--max-plies", type=int, default=80)
+    parser.add_argument("--search-every", type=int, default=0, help="let the engine play every n-th move, 0 for never")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = None
+    port = args.port
+    if port is None:
+        port = get_free_port()
+        server = subprocess.Popen([sys.executable, "-m", "rpg_chess.Controller.server", "--port", str(port), "--idle-timeout", "5"],
+                                  stdout=subprocess.PIPE, text=True)
+        server.stdout.readline() # "serving on ..." once it listens
+    try:
+        asyncio.run(run(args.host, port, args.clients, args.games, args.max_plies, args.search_every, args.seed))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# Perft: count the leaf nodes of the legal move tree to a fixed depth, the correctness and speed benchmark of the engine
+# usage (from the repository root):
+#   python -m benchmarks.perft                       run the reference positions and compare with the stored baseline
+#   python -m benchmarks.perft --max-depth 5         go deeper, every reference count up to that depth is checked
+#   python -m benchmarks.perft --save-baseline       store the speed of this run as the new baseline (benchmarks/perft_baseline.json)
+#   python -m benchmarks.perft --divide 3 [FEN]      node count below every legal move, to find which move generation is wrong
+import argparse
+import json
+import os
+import sys
+import time
+from rpg_chess.Controller import chess_engine
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# (name, FEN, {depth: nodes}) from the chess programming wiki perft results and the peterellisjones edge case collection,
+# the edge cases are published for one deep count only, their shallow counts were taken from this engine after it matched the deep one
+POSITIONS = [
+    ("start", START_FEN,
+     {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     {1: 48, 2: 2039, 3: 97862, 4: 4085603}),
+    ("position3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    ("position4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ("position5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     {1: 44, 2: 1486, 3: 62379, 4: 2103487}),
+    ("position6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     {1: 46, 2: 2079, 3: 89890}),
+    ("illegal_enpassant_1", "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1",
+     {1: 18, 2: 92, 3: 1670, 6: 1134888}),
+    ("illegal_enpassant_2", "8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1",
+     {1: 13, 2: 102, 3: 1266, 6: 1015133}),
+    ("enpassant_check", "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1",
+     {1: 15, 2: 126, 3: 1928, 6: 1440467}),
+    ("short_castle_check", "5k2/8/8/8/8/8/8/4K2R w K - 0 1",
+     {1: 15, 2: 66, 3: 1198, 6: 661072}),
+    ("long_castle_check", "3k4/8/8/8/8/8/8/R3K3 w Q - 0 1",
+     {1: 16, 2: 71, 3: 1286, 6: 803711}),
+    ("castle_rights", "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1",
+     {1: 26, 2: 1141, 3: 27826, 4: 1274206}),
+    ("castle_prevented", "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1",
+     {1: 44, 2: 1494, 3: 50509, 4: 1720476}),
+    ("promote_out_of_check", "2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1",
+     {1: 11, 2: 133, 3: 1442, 6: 3821001}),
+    ("discovered_check", "8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1",
+     {1: 29, 2: 165, 3: 5160, 5: 1004658}),
+    ("promote_to_check", "4k3/1P6/8/8/8/8/K7/8 w - - 0 1",
+     {1: 9, 2: 40, 3: 472, 6: 217342}),
+    ("underpromote_to_check", "8/P1k5/K7/8/8/8/8/8 w - - 0 1",
+     {1: 6, 2: 27, 3: 273, 6: 92683}),
+    ("self_stalemate", "K1k5/8/P7/8/8/8/8/8 w - - 0 1",
+     {1: 2, 2: 6, 3: 13, 6: 2217}),
+    ("stalemate_and_checkmate", "8/k1P5/8/1K6/8/8/8/8 w - - 0 1",
+     {1: 10, 2: 25, 3: 268, 7: 567584}),
+    ("double_check", "8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1",
+     {1: 37, 2: 183, 3: 6559, 4: 23527}),
+]
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "perft_baseline.json")
+
+def perft(gs, depth):
+    moves = gs.get_valid_moves()
+    if depth == 1: # bulk counting, the leaves do not have to be played
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        gs.make_move(move)
+        nodes += perft(gs, depth - 1)
+        gs.undo_move()
+    return nodes
+
+def divide(gs, depth):
+    results = {}
+    for move in gs.get_valid_moves():
+        gs.make_move(move)
+        results[move.get_chess_notation()] = perft(gs, depth - 1) if depth > 1 else 1
+        gs.undo_move()
+    return results
+
+def load_baseline():
+    if not os.path.exists(BASELINE_PATH):
+        return {}
+    with open(BASELINE_PATH) as file:
+        return json.load(file)
+
+# returns False if a node count is wrong or the total speed dropped more than tolerance below the baseline
+def run_suite(backend, max_depth, move_cache_size, repeats, tolerance, save_baseline):
+    baseline = load_baseline()
+    backend_baseline = baseline.get(backend, {})
+    results = {}
+    ok = True
+    total_nodes = 0
+    total_time = 0.0
+    print(f"{'position':24} {'depth':>5} {'nodes':>10} {'expected':>10} {'time':>8} {'nodes/s':>10} {'baseline':>10}")
+    for name, fen, expected in POSITIONS:
+        for depth in sorted(expected):
+            if depth > max_depth:
+                continue
+            best = None
+            for _ in range(repeats): # best of several runs, single runs are too noisy to compare
+                gs = chess_engine.GameState(backend, move_cache_size, fen)
+                start = time.perf_counter()
+                nodes = perft(gs, depth)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            nodes_per_second = nodes / best if best > 0 else 0.0
+            status = ""
+            if nodes != expected[depth]:
+                status = "WRONG COUNT"
+                ok = False
+            key = f"{name}/{depth}"
+            results[key] = round(nodes_per_second)
+            total_nodes += nodes
+            total_time += best
+            reference = backend_baseline.get(key)
+            reference_text = f"{reference:10}" if reference else f"{'-':>10}"
+            print(f"{name:24} {depth:5} {nodes:10} {expected[depth]:10} {best:8.3f} {nodes_per_second:10.0f} {reference_text} {status}")
+
+    total_nodes_per_second = total_nodes / total_time if total_time > 0 else 0.0
+    print(f"total {total_nodes} nodes in {total_time:.3f}s, {total_nodes_per_second:.0f} nodes/s")
+    # the baseline total only compares with a run over the same positions and depths
+    total_key = f"total/{max_depth}"
+    reference = backend_baseline.get(total_key)
+    if reference:
+        change = total_nodes_per_second / reference - 1
+        print(f"baseline {reference} nodes/s, {change:+.1%}")
+        if change < -tolerance:
+            print(f"REGRESSION: more than {tolerance:.0%} slower than the baseline")
+            ok = False
+    results[total_key] = round(total_nodes_per_second)
+
+    if save_baseline:
+        backend_baseline.update(results)
+        baseline[backend] = backend_baseline
+        with open(BASELINE_PATH, "w") as file:
+            json.dump(baseline, file, indent=2, sort_keys=True)
+        print(f"baseline saved to {BASELINE_PATH}")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="Perft node counts and speed of the chess engine")
+    parser.add_argument("--backend", default="list", choices=("list", "bitboard", "classes"))
+    parser.add_argument("--max-depth", type=int, default=3, help="deepest reference depth to run for every position")
+    parser.add_argument("--move-cache", type=int, default=0, help="GameState move cache size, 0 generates every node")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per position, the fastest one counts")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed slowdown against the baseline, 0.10 = 10%%")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--divide", nargs="+", metavar=("DEPTH", "FEN"), help="depth and optional FEN (default start position)")
+    args = parser.parse_args()
+
+    if args.divide:
+        depth = int(args.divide[0])
+        fen = " ".join(args.divide[1:]) if len(args.divide) > 1 else START_FEN
+        gs = chess_engine.GameState(args.backend, args.move_cache, fen)
+        start = time.perf_counter()
+        results = divide(gs, depth)
+        elapsed = time.perf_counter() - start
+        for notation in sorted(results):
+            print(f"{notation}: {results[notation]}")
+        total = sum(results.values())
+        print(f"\n{len(results)} moves, {total} nodes, {elapsed:.3f}s, {total / elapsed if elapsed > 0 else 0:.0f} nodes/s")
+        return
+
+    if not run_suite(args.backend, args.max_depth, args.move_cache, args.repeat, args.tolerance, args.save_baseline):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
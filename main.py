@@ -1,5 +1,10 @@
+import os
 import pygame
+from rpg_chess.Controller import book
 from rpg_chess.Controller import chess_engine
+from rpg_chess.Controller import engine_worker
+from rpg_chess.Controller import parallel_search
+from rpg_chess.Controller import search
 from rpg_chess.Data.constants import *
 from rpg_chess.View.draw import *
 
@@ -10,22 +15,38 @@ def main():
     clock = pygame.time.Clock()
     screen.fill(pygame.Color("white"))
     gs = chess_engine.GameState()
-    valid_moves = gs.get_valid_moves()
+    valid_moves = chess_engine.MoveIndex(gs.get_valid_moves())
     move_made = False # so we know when to stop checking for next move is a check
     load_images()
     running = True
     square_selected = () #no selected square -> tuple (row, col)
     player_clicks = [] #keep track of player clicks with 2 tuples for ex.  [(6, 4), (4, 4)] -> select and unselect a piece
     game_over = False
+    player_one = True # True if a human plays white, False for the computer
+    player_two = False # same for black
+    searcher = parallel_search.ParallelSearcher(AI_WORKERS) if AI_WORKERS > 1 else search.Searcher()
+    if AI_BOOK and os.path.exists(book.BOOK_PATH): # built with python -m rpg_chess.Controller.book build
+        searcher.book = book.OpeningBook(book.BOOK_PATH)
+    engine = engine_worker.EngineWorker(searcher) # the computer thinks on a background thread, the window stays responsive
+    engine_position = None # (moves played, position key) the engine is working on, None when it is idle
+    renderer = BoardRenderer(screen)
+    idle = False # nothing changed on screen last frame and the game waits for the human
 
     while running:
-        for event in pygame.event.get():
+        human_turn = (gs.white_to_move and player_one) or (not gs.white_to_move and player_two)
+        events = pygame.event.get()
+        if idle and not events: # sleep until something happens instead of spinning at FPS
+            events = [pygame.event.wait(IDLE_WAIT)]
+        for event in events:
             if event.type == pygame.QUIT:
                 running = False
 
+            elif event.type == pygame.VIDEOEXPOSE: # the window was covered, the screen has to be repainted
+                renderer.invalidate()
+
             # mouse handler
             elif event.type == pygame.MOUSEBUTTONDOWN:
-                if not game_over:
+                if not game_over and human_turn:
                     location = pygame.mouse.get_pos() # (x, y) location of mouse
                     col = location[0] // SQUARE_SIZE
                     row= location[1] // SQUARE_SIZE
@@ -37,49 +58,79 @@ def main():
                         player_clicks.append(square_selected)
 
                     if len(player_clicks) == 2: # we have 2 legal clicks
-                        move = chess_engine.Move(player_clicks[0], player_clicks[1], gs.board)
-                        print(move.get_chess_notation())
-
-                        for i in range(len(valid_moves)):
-                            if move == valid_moves[i]:
-                                gs.make_move(valid_moves[i])
-                                move_made = True
-                                square_selected = () # move made unselect clicks
-                                player_clicks = []
+                        move = valid_moves.get_move(player_clicks[0], player_clicks[1])
+                        if move is not None:
+                            print(move.get_chess_notation())
+                            gs.make_move(move)
+                            move_made = True
+                            square_selected = () # move made unselect clicks
+                            player_clicks = []
                         if not move_made: # fix for clicks if invalid move (we used to click 2 times)
                             player_clicks = [square_selected]
 
             # key handler
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_z: # undo a move when z is pressed
+                    engine.cancel() # a move the computer finds now would be for the wrong position
+                    engine_position = None
                     gs.undo_move()
                     move_made = True
                 if event.key == pygame.K_r: # reset the board when r is pressed
+                    engine.cancel()
+                    engine_position = None
                     gs = chess_engine.GameState()
-                    valid_moves = gs.get_valid_moves()
+                    valid_moves = chess_engine.MoveIndex(gs.get_valid_moves())
                     square_selected = ()
                     player_clicks = []
                     move_made = False
 
             if move_made:
-                valid_moves = gs.get_valid_moves()
+                valid_moves = chess_engine.MoveIndex(gs.get_valid_moves())
                 move_made = False
 
-        draw_game_state(screen, gs, valid_moves, square_selected)
+        # computer move, searched in the background and picked up here once it is ready
+        human_turn = (gs.white_to_move and player_one) or (not gs.white_to_move and player_two)
+        if not game_over and not human_turn and len(valid_moves) > 0:
+            notation = engine.poll()
+            if notation is not None:
+                gs.make_move(search.get_move_from_notation(gs, notation))
+                valid_moves = chess_engine.MoveIndex(gs.get_valid_moves())
 
+        # give the engine the position it should think about: a search on the computer's turn, pondering on the human's
+        human_turn = (gs.white_to_move and player_one) or (not gs.white_to_move and player_two)
+        position = (len(gs.move_log), gs.position_key)
+        if game_over or len(valid_moves) == 0:
+            if engine_position is not None:
+                engine.cancel()
+                engine_position = None
+        elif position != engine_position:
+            if not human_turn:
+                engine.start_search(gs, AI_TIME_LIMIT)
+            elif AI_PONDER and (player_one != player_two): # pondering only helps if the computer plays the other side
+                engine.start_pondering(gs)
+            else:
+                engine.cancel()
+            engine_position = position
+
+        text = None
         if gs.checkmate:
             game_over = True
             if gs.white_to_move:
-                draw_text(screen, "Black wins by checkmate!")
+                text = "Black wins by checkmate!"
             else:
-                draw_text(screen, "White wins by checkmate!")
-        elif gs.stalemate:
+                text = "White wins by checkmate!"
+        elif gs.stalemate or gs.is_threefold_repetition():
             game_over = True
-            draw_text(screen, "Draw")
+            text = "Draw"
 
+        dirty = renderer.draw(gs, valid_moves, square_selected, text)
+        if dirty:
+            pygame.display.update(dirty) # only the squares that changed
+        human_turn = (gs.white_to_move and player_one) or (not gs.white_to_move and player_two)
+        idle = not dirty and (human_turn or game_over)
         clock.tick(FPS)
-        pygame.display.flip()
-        
+    engine.stop()
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
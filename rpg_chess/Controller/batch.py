@@ -0,0 +1,168 @@
+# Batch encoding and evaluation of many positions with NumPy, for analysis and training data: positions become rows of
+# 64 piece codes, then 12x8x8 piece planes plus side to move, castling and en passant features, and the material and
+# piece-square evaluation of evaluation.evaluate is computed for the whole batch at once.
+# Files of FENs (one per line, extra fields after the FEN are ignored) are read in chunks so memory stays bounded.
+# NumPy is optional for the rest of the game and only needed here: pip install numpy
+# usage (from the repository root): python -m rpg_chess.Controller.batch positions.fen [--chunk-size 65536] [--output chunks/]
+import argparse
+import os
+import time
+from rpg_chess.Controller import evaluation
+from rpg_chess.Controller import zobrist
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PLANE_PIECES = ("wP", "wN", "wB", "wR", "wQ", "wK", "bP", "bN", "bB", "bR", "bQ", "bK") # piece code - 1 is the plane
+PIECE_CODES = {"--": 0, **{piece: code + 1 for code, piece in enumerate(PLANE_PIECES)}}
+# side to move, castling rights KQkq, en passant column a-h
+FEATURES = ("white_to_move", "white_king_side", "white_queen_side", "black_king_side", "black_queen_side") + \
+           tuple(f"enpassant_{file}" for file in "abcdefgh")
+
+# FEN piece placement -> one byte per square: digits become that many dots, slashes go, then letters become codes
+FEN_EXPAND = str.maketrans({**{str(count): "." * count for count in range(1, 9)}, "/": None})
+FEN_VALID = str.maketrans(dict.fromkeys("PNBRQKpnbrqk12345678/")) # deletes every character a placement may have
+FEN_CODES = bytes(PIECE_CODES[("w" if chr(char).isupper() else "b") + chr(char).upper()] if chr(char) in "PNBRQKpnbrqk" else 0
+                  for char in range(256))
+
+def require_numpy():
+    if np is None:
+        raise ImportError("rpg_chess.Controller.batch needs NumPy: pip install numpy")
+
+tables = None # (midgame, endgame, phase) lookup arrays, built on first use
+
+# [piece code, square] -> white minus black score, [piece code] -> phase weight, code 0 (empty) adds nothing
+def get_tables():
+    global tables
+    if tables is None:
+        require_numpy()
+        midgame = np.zeros((13, 64), np.int32)
+        endgame = np.zeros((13, 64), np.int32)
+        phase = np.zeros(13, np.int32)
+        for piece, code in PIECE_CODES.items():
+            if piece != "--":
+                sign = 1 if piece[0] == "w" else -1
+                midgame[code] = sign * np.array(evaluation.MIDGAME_TABLES[piece])
+                endgame[code] = sign * np.array(evaluation.ENDGAME_TABLES[piece])
+                phase[code] = evaluation.PHASE_WEIGHTS[piece[1]]
+        tables = (midgame, endgame, phase)
+    return tables
+
+# feature bytes of the FEN fields, numpy scalar writes per position would cost more than the whole encoding
+SIDE_BYTES = {"w": b"\x01", "b": b"\x00"}
+CASTLING_BYTES = {}
+ENPASSANT_BYTES = {"-": bytes(8), **{file + rank: bytes(int(file == other) for other in "abcdefgh") for file in "abcdefgh" for rank in "36"}}
+
+RIGHTS_BYTES = [bytes((rights >> bit) & 1 for bit in range(4)) for rights in range(16)] # zobrist.get_castle_rights_index -> KQkq
+
+def get_castling_bytes(castling):
+    if castling not in CASTLING_BYTES:
+        CASTLING_BYTES[castling] = bytes(int(char in castling) for char in "KQkq")
+    return CASTLING_BYTES[castling]
+
+# (codes N x 64 uint8, features N x 13 uint8) of FEN strings
+def encode_fens(fens):
+    require_numpy()
+    placements = []
+    features = []
+    for fen in fens:
+        fields = fen.split()
+        if len(fields) < 4 or fields[1] not in SIDE_BYTES or fields[3] not in ENPASSANT_BYTES:
+            raise ValueError(f"Invalid FEN {fen}")
+        invalid = fields[0].translate(FEN_VALID) # anything left is not a piece, a digit 1-8 or a slash
+        if invalid:
+            raise ValueError(f"Invalid piece {invalid[0]} in FEN {fen}")
+        ranks = fields[0].split("/")
+        if len(ranks) != 8:
+            raise ValueError(f"Invalid FEN {fen}")
+        for rank in ranks: # 9 squares then 7 would still add up to 64
+            if len(rank.translate(FEN_EXPAND)) != 8:
+                raise ValueError(f"Invalid rank {rank} in FEN {fen}")
+        placements.append(fields[0].translate(FEN_EXPAND).encode())
+        features.append(SIDE_BYTES[fields[1]] + get_castling_bytes(fields[2]) + ENPASSANT_BYTES[fields[3]])
+    codes = np.frombuffer(b"".join(placements).translate(FEN_CODES), np.uint8).reshape(len(fens), 64)
+    return codes, np.frombuffer(b"".join(features), np.uint8).reshape(len(fens), len(FEATURES))
+
+# same for GameStates, without going through a FEN
+def encode_game_states(states):
+    require_numpy()
+    codes = np.frombuffer(bytes(PIECE_CODES[piece] for gs in states for row in gs.board for piece in row), np.uint8)
+    features = []
+    for gs in states:
+        rights = zobrist.get_castle_rights_index(gs.current_castling_rights) # bits K, Q, k, q like the features
+        enpassant = ENPASSANT_BYTES["abcdefgh"[gs.enpassant_possible[1]] + "3"] if gs.enpassant_possible != () else ENPASSANT_BYTES["-"]
+        features.append(SIDE_BYTES["w" if gs.white_to_move else "b"] + RIGHTS_BYTES[rights] + enpassant)
+    return codes.reshape(len(states), 64), np.frombuffer(b"".join(features), np.uint8).reshape(len(states), len(FEATURES))
+
+# N x 12 x 8 x 8 uint8 planes, plane PLANE_PIECES.index(piece) is 1 where that piece stands (rows a8 first like the board)
+def get_planes(codes):
+    require_numpy()
+    return (codes[:, None, :] == np.arange(1, 13, dtype=np.uint8)[None, :, None]).astype(np.uint8).reshape(len(codes), 12, 8, 8)
+
+# int32 scores of evaluation.evaluate for every position, from the side to move's point of view
+def evaluate_codes(codes, features):
+    midgame, endgame, phase_weights = get_tables()
+    squares = np.arange(64)
+    midgame_scores = midgame[codes, squares].sum(axis=1)
+    endgame_scores = endgame[codes, squares].sum(axis=1)
+    phase = np.minimum(phase_weights[codes].sum(axis=1), evaluation.TOTAL_PHASE)
+    scores = (midgame_scores * phase + endgame_scores * (evaluation.TOTAL_PHASE - phase)) // evaluation.TOTAL_PHASE
+    return np.where(features[:, 0] == 1, scores, -scores).astype(np.int32)
+
+# the same from piece planes, for callers that only kept the planes
+def evaluate_planes(planes, features):
+    midgame, endgame, phase_weights = get_tables()
+    flat = planes.reshape(len(planes), 12, 64).astype(np.int32)
+    midgame_scores = np.einsum("nps,ps->n", flat, midgame[1:])
+    endgame_scores = np.einsum("nps,ps->n", flat, endgame[1:])
+    phase = np.minimum(flat.sum(axis=2) @ phase_weights[1:], evaluation.TOTAL_PHASE)
+    scores = (midgame_scores * phase + endgame_scores * (evaluation.TOTAL_PHASE - phase)) // evaluation.TOTAL_PHASE
+    return np.where(features[:, 0] == 1, scores, -scores).astype(np.int32)
+
+# lists of at most chunk_size FENs from a file, blank lines and # comments are skipped
+def read_fen_chunks(path, chunk_size = 1 << 16):
+    chunk = []
+    with open(path) as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            chunk.append(line)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+# (planes, features, scores) per chunk of the file, only one chunk is in memory at a time
+def stream_batches(path, chunk_size = 1 << 16):
+    for fens in read_fen_chunks(path, chunk_size):
+        codes, features = encode_fens(fens)
+        yield get_planes(codes), features, evaluate_codes(codes, features)
+
+def main():
+    parser = argparse.ArgumentParser(description="Encode and evaluate a file of FEN positions in batches")
+    parser.add_argument("path")
+    parser.add_argument("--chunk-size", type=int, default=1 << 16, help="positions per batch")
+    parser.add_argument("--output", help="directory for one .npz file (planes, features, scores) per batch")
+    args = parser.parse_args()
+    require_numpy()
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+
+    positions = 0
+    total = 0
+    start = time.perf_counter()
+    for index, (planes, features, scores) in enumerate(stream_batches(args.path, args.chunk_size)):
+        positions += len(scores)
+        total += int(scores.sum())
+        if args.output:
+            np.savez_compressed(os.path.join(args.output, f"batch_{index:05}.npz"), planes=planes, features=features, scores=scores)
+    elapsed = time.perf_counter() - start
+    print(f"{positions} positions, mean score {total / positions if positions else 0:.1f}, {elapsed:.2f}s, "
+          f"{positions / elapsed if elapsed > 0 else 0:.0f} positions/s")
+
+if __name__ == "__main__":
+    main()
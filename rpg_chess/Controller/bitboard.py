@@ -0,0 +1,300 @@
+# Bitboard backend for GameState, every square is one bit of a python int: square = row * 8 + col (a8 = 0, h1 = 63)
+from array import array
+
+SQUARE_COORDINATES = [divmod(square, 8) for square in range(64)] # square -> (row, col)
+
+def get_square_bit(row, col):
+    return 1 << (row * 8 + col)
+
+def get_squares(bitboard): # yields the index of every set bit
+    while bitboard:
+        bit = bitboard & -bitboard
+        yield bit.bit_length() - 1
+        bitboard ^= bit
+
+def build_jump_table(directions):
+    table = []
+    for square in range(64):
+        row, col = divmod(square, 8)
+        attacks = 0
+        for d in directions:
+            end_row = row + d[0]
+            end_col = col + d[1]
+            if 0 <= end_row <= 7 and 0 <= end_col <= 7:
+                attacks |= get_square_bit(end_row, end_col)
+        table.append(attacks)
+    return table
+
+KNIGHT_ATTACKS = build_jump_table(((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)))
+KING_ATTACKS = build_jump_table(((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)))
+PAWN_ATTACKS = {"w": build_jump_table(((-1, -1), (-1, 1))), "b": build_jump_table(((1, -1), (1, 1)))} # squares a pawn of that color attacks
+
+# sliding directions, the first four increase the square index (the nearest blocker is the lowest bit), the last four decrease it
+ROOK_DIRECTIONS = ((1, 0), (0, 1), (-1, 0), (0, -1))
+BISHOP_DIRECTIONS = ((1, 1), (1, -1), (-1, -1), (-1, 1))
+DIRECTIONS = ((1, 0), (0, 1), (1, 1), (1, -1), (-1, 0), (0, -1), (-1, -1), (-1, 1))
+
+def build_ray_table(d):
+    table = []
+    for square in range(64):
+        row, col = divmod(square, 8)
+        ray = 0
+        end_row, end_col = row + d[0], col + d[1]
+        while 0 <= end_row <= 7 and 0 <= end_col <= 7:
+            ray |= get_square_bit(end_row, end_col)
+            end_row += d[0]
+            end_col += d[1]
+        table.append(ray)
+    return table
+
+RAYS = {d: build_ray_table(d) for d in DIRECTIONS}
+POSITIVE_DIRECTIONS = set(DIRECTIONS[:4])
+
+# BETWEEN[a][b] holds the squares strictly between two aligned squares, 0 if they are not on one line
+BETWEEN = [[0] * 64 for _ in range(64)]
+for d in DIRECTIONS:
+    for square in range(64):
+        for target in get_squares(RAYS[d][square]):
+            BETWEEN[square][target] = RAYS[d][square] & ~RAYS[d][target] & ~(1 << target)
+
+def get_ray_attacks(square, occupied, d):
+    ray = RAYS[d][square]
+    blockers = ray & occupied
+    if blockers:
+        if d in POSITIVE_DIRECTIONS:
+            first = (blockers & -blockers).bit_length() - 1
+        else:
+            first = blockers.bit_length() - 1
+        ray ^= RAYS[d][first] # cut off everything behind the first blocker
+    return ray
+
+# per direction tables, the attack functions below are the hot path so they unroll get_ray_attacks
+ROOK_POSITIVE_RAYS = (RAYS[(1, 0)], RAYS[(0, 1)])
+ROOK_NEGATIVE_RAYS = (RAYS[(-1, 0)], RAYS[(0, -1)])
+BISHOP_POSITIVE_RAYS = (RAYS[(1, 1)], RAYS[(1, -1)])
+BISHOP_NEGATIVE_RAYS = (RAYS[(-1, -1)], RAYS[(-1, 1)])
+
+def get_slider_attacks(square, occupied, positive_rays, negative_rays):
+    attacks = 0
+    for rays in positive_rays:
+        ray = rays[square]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[(blockers & -blockers).bit_length() - 1]
+        attacks |= ray
+    for rays in negative_rays:
+        ray = rays[square]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[blockers.bit_length() - 1]
+        attacks |= ray
+    return attacks
+
+def get_rook_attacks(square, occupied):
+    return get_slider_attacks(square, occupied, ROOK_POSITIVE_RAYS, ROOK_NEGATIVE_RAYS)
+
+def get_bishop_attacks(square, occupied):
+    return get_slider_attacks(square, occupied, BISHOP_POSITIVE_RAYS, BISHOP_NEGATIVE_RAYS)
+
+# move flags returned by get_legal_moves
+NORMAL, ENPASSANT, CASTLE, PROMOTE_QUEEN, PROMOTE_ROOK, PROMOTE_BISHOP, PROMOTE_KNIGHT = 0, 1, 2, 3, 4, 5, 6
+
+# a move packed in 16 bits: start square in bits 0-5, end square in bits 6-11, flag in bits 12-15
+def pack_move(start, end, flag = NORMAL):
+    return start | (end << 6) | (flag << 12)
+
+def unpack_move(packed): # -> (start, end, flag)
+    return packed & 63, (packed >> 6) & 63, packed >> 12
+PROMOTION_PIECES = {PROMOTE_QUEEN: "Q", PROMOTE_ROOK: "R", PROMOTE_BISHOP: "B", PROMOTE_KNIGHT: "N"}
+PROMOTION_ROWS = 0xFF | (0xFF << 56)
+
+PAWN_START_ROWS = {"w": 0xFF << 48, "b": 0xFF << 8}
+
+class Bitboards:
+    def __init__(self, board):
+        self.pieces = {color + piece: 0 for color in "wb" for piece in "PRNBQK"}
+        for row in range(8):
+            for col in range(8):
+                if board[row][col] != "--":
+                    self.pieces[board[row][col]] |= get_square_bit(row, col)
+        self.colors = {"w": 0, "b": 0}
+        for piece, bitboard in self.pieces.items():
+            self.colors[piece[0]] |= bitboard
+
+    def move_piece(self, piece, start, end):
+        bits = (1 << start) | (1 << end)
+        self.pieces[piece] ^= bits
+        self.colors[piece[0]] ^= bits
+
+    def toggle_piece(self, piece, square):
+        self.pieces[piece] ^= 1 << square
+        self.colors[piece[0]] ^= 1 << square
+
+    # mirror GameState.make_move, called with the same Move object
+    def make_move(self, move):
+        start = move.start_row * 8 + move.start_col
+        end = move.end_row * 8 + move.end_col
+        if move.is_enpassant:
+            self.toggle_piece(move.piece_captured, move.start_row * 8 + move.end_col)
+        elif move.piece_captured != "--":
+            self.toggle_piece(move.piece_captured, end)
+        if move.is_pawn_promotion:
+            self.toggle_piece(move.piece_moved, start)
+            self.toggle_piece(move.piece_moved[0] + move.promotion_choice, end)
+        else:
+            self.move_piece(move.piece_moved, start, end)
+        if move.is_castle_move:
+            rook = move.piece_moved[0] + "R"
+            if move.end_col - move.start_col == 2: # kingside
+                self.move_piece(rook, end + 1, end - 1)
+            else: # queenside
+                self.move_piece(rook, end - 2, end + 1)
+
+    def undo_move(self, move):
+        start = move.start_row * 8 + move.start_col
+        end = move.end_row * 8 + move.end_col
+        if move.is_castle_move:
+            rook = move.piece_moved[0] + "R"
+            if move.end_col - move.start_col == 2: # kingside
+                self.move_piece(rook, end - 1, end + 1)
+            else: # queenside
+                self.move_piece(rook, end + 1, end - 2)
+        if move.is_pawn_promotion:
+            self.toggle_piece(move.piece_moved[0] + move.promotion_choice, end)
+            self.toggle_piece(move.piece_moved, start)
+        else:
+            self.move_piece(move.piece_moved, end, start)
+        if move.is_enpassant:
+            self.toggle_piece(move.piece_captured, move.start_row * 8 + move.end_col)
+        elif move.piece_captured != "--":
+            self.toggle_piece(move.piece_captured, end)
+
+    # all pieces of enemy_color attacking the square with the given occupancy
+    def get_attackers(self, square, enemy_color, occupied):
+        pieces = self.pieces
+        ally_color = "w" if enemy_color == "b" else "b"
+        queens = pieces[enemy_color + "Q"]
+        return ((KNIGHT_ATTACKS[square] & pieces[enemy_color + "N"]) |
+                (KING_ATTACKS[square] & pieces[enemy_color + "K"]) |
+                (PAWN_ATTACKS[ally_color][square] & pieces[enemy_color + "P"]) | # enemy pawns sit where our pawn would attack
+                (get_rook_attacks(square, occupied) & (pieces[enemy_color + "R"] | queens)) |
+                (get_bishop_attacks(square, occupied) & (pieces[enemy_color + "B"] | queens)))
+
+    # every square some enemy piece attacks, the attack sets get_attackers looks up ORed together piece by piece
+    def get_attacked_squares(self, enemy_color, occupied):
+        pieces = self.pieces
+        attacked = 0
+        for square in get_squares(pieces[enemy_color + "P"]):
+            attacked |= PAWN_ATTACKS[enemy_color][square]
+        for square in get_squares(pieces[enemy_color + "N"]):
+            attacked |= KNIGHT_ATTACKS[square]
+        for square in get_squares(pieces[enemy_color + "K"]):
+            attacked |= KING_ATTACKS[square]
+        for square in get_squares(pieces[enemy_color + "R"] | pieces[enemy_color + "Q"]):
+            attacked |= get_rook_attacks(square, occupied)
+        for square in get_squares(pieces[enemy_color + "B"] | pieces[enemy_color + "Q"]):
+            attacked |= get_bishop_attacks(square, occupied)
+        return attacked
+
+    def is_square_attacked(self, square, enemy_color):
+        return self.get_attackers(square, enemy_color, self.colors["w"] | self.colors["b"]) != 0
+
+    # legal moves as an array of packed moves plus whether the side to move is in check
+    def get_legal_moves(self, white_to_move, castle_rights, enpassant_possible):
+        ally_color, enemy_color = ("w", "b") if white_to_move else ("b", "w")
+        pieces = self.pieces
+        allies = self.colors[ally_color]
+        enemies = self.colors[enemy_color]
+        occupied = allies | enemies
+        king_square = pieces[ally_color + "K"].bit_length() - 1
+        moves = array("H") # packed moves, no object per move
+
+        # king moves, tested with the king removed so it cannot shield the square behind it
+        occupied_without_king = occupied ^ (1 << king_square)
+        for end in get_squares(KING_ATTACKS[king_square] & ~allies):
+            if not self.get_attackers(end, enemy_color, occupied_without_king):
+                moves.append(king_square | (end << 6))
+
+        checkers = self.get_attackers(king_square, enemy_color, occupied)
+        in_check = checkers != 0
+        if checkers & (checkers - 1): # double check, only the king can move
+            return moves, in_check
+        if checkers: # capture the checker or block the ray
+            check_mask = checkers | BETWEEN[king_square][checkers.bit_length() - 1]
+        else:
+            check_mask = ~0
+
+        # pinned pieces may only move along the ray between king and pinner
+        pin_rays = {}
+        enemy_queens = pieces[enemy_color + "Q"]
+        for directions, sliders in ((ROOK_DIRECTIONS, pieces[enemy_color + "R"] | enemy_queens),
+                                    (BISHOP_DIRECTIONS, pieces[enemy_color + "B"] | enemy_queens)):
+            for d in directions:
+                if not RAYS[d][king_square] & sliders:
+                    continue
+                blockers = get_ray_attacks(king_square, occupied, d) & allies
+                if blockers:
+                    behind = get_ray_attacks(king_square, occupied ^ blockers, d) & sliders
+                    if behind:
+                        pin_rays[blockers.bit_length() - 1] = BETWEEN[king_square][behind.bit_length() - 1] | behind
+
+        targets = ~allies & check_mask
+        for piece, get_attacks in (("N", None), ("B", get_bishop_attacks), ("R", get_rook_attacks), ("Q", None)):
+            for start in get_squares(pieces[ally_color + piece]):
+                if piece == "N":
+                    if start in pin_rays: # a pinned knight can never move
+                        continue
+                    attacks = KNIGHT_ATTACKS[start]
+                elif piece == "Q":
+                    attacks = get_rook_attacks(start, occupied) | get_bishop_attacks(start, occupied)
+                else:
+                    attacks = get_attacks(start, occupied)
+                attacks &= targets & pin_rays.get(start, ~0)
+                for end in get_squares(attacks):
+                    moves.append(start | (end << 6))
+
+        # pawns
+        if white_to_move:
+            forward, start_rows = -8, PAWN_START_ROWS["w"]
+        else:
+            forward, start_rows = 8, PAWN_START_ROWS["b"]
+        enpassant_square = enpassant_possible[0] * 8 + enpassant_possible[1] if enpassant_possible != () else -1
+        for start in get_squares(pieces[ally_color + "P"]):
+            mask = check_mask & pin_rays.get(start, ~0)
+            one = start + forward
+            if (PROMOTION_ROWS >> one) & 1: # every push or capture of this pawn promotes
+                for end in get_squares(((~occupied & (1 << one)) | (PAWN_ATTACKS[ally_color][start] & enemies)) & mask):
+                    for flag in PROMOTION_PIECES:
+                        moves.append(start | (end << 6) | (flag << 12))
+                continue
+            if not (occupied >> one) & 1:
+                if (mask >> one) & 1:
+                    moves.append(start | (one << 6))
+                two = one + forward
+                if (start_rows >> start) & 1 and not (occupied >> two) & 1 and (mask >> two) & 1:
+                    moves.append(start | (two << 6))
+            for end in get_squares(PAWN_ATTACKS[ally_color][start] & enemies & mask):
+                moves.append(start | (end << 6))
+            if enpassant_square >= 0 and (PAWN_ATTACKS[ally_color][start] >> enpassant_square) & 1:
+                captured = enpassant_square - forward
+                # play the capture on the occupancy and look for any attacker of our king, this covers the two pawns leaving one rank
+                after = occupied ^ (1 << start) ^ (1 << captured) ^ (1 << enpassant_square)
+                pieces[enemy_color + "P"] ^= 1 << captured
+                exposed = self.get_attackers(king_square, enemy_color, after)
+                pieces[enemy_color + "P"] ^= 1 << captured
+                if not exposed:
+                    moves.append(start | (enpassant_square << 6) | (ENPASSANT << 12))
+
+        # castling, the king may not start, pass or land on an attacked square
+        if not in_check:
+            if white_to_move:
+                king_side, queen_side = castle_rights.white_king_side, castle_rights.white_queen_side
+            else:
+                king_side, queen_side = castle_rights.black_king_side, castle_rights.black_queen_side
+            if king_side and not occupied & ((1 << (king_square + 1)) | (1 << (king_square + 2))):
+                if not self.get_attackers(king_square + 1, enemy_color, occupied) and not self.get_attackers(king_square + 2, enemy_color, occupied):
+                    moves.append(king_square | ((king_square + 2) << 6) | (CASTLE << 12))
+            if queen_side and not occupied & ((1 << (king_square - 1)) | (1 << (king_square - 2)) | (1 << (king_square - 3))):
+                if not self.get_attackers(king_square - 1, enemy_color, occupied) and not self.get_attackers(king_square - 2, enemy_color, occupied):
+                    moves.append(king_square | ((king_square - 2) << 6) | (CASTLE << 12))
+        return moves, in_check
@@ -0,0 +1,166 @@
+# Opening book: sorted fixed width records in the Polyglot layout (key, move, weight, learn, 16 bytes big endian),
+# the file is mapped with mmap and searched in place, so opening it costs nothing and every process shares the page cache.
+# The key is GameState.position_key, not the Polyglot random table, books of other tools do not match this engine.
+# usage (from the repository root):
+#   python -m rpg_chess.Controller.book build books/openings.bin games.pgn [more.pgn ...] [--max-plies 20] [--min-games 2]
+#   python -m rpg_chess.Controller.book probe books/openings.bin [FEN]
+import argparse
+import mmap
+import os
+import random
+import struct
+import time
+from rpg_chess.Controller import chess_engine
+from rpg_chess.Controller import pgn
+
+BOOK_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "books", "openings.bin")
+
+ENTRY = struct.Struct(">QHHI") # key, move, weight, learn
+KEY = struct.Struct(">Q")
+PROMOTION_CODES = {"N": 1, "B": 2, "R": 3, "Q": 4}
+MAX_WEIGHT = 0xFFFF
+
+# Polyglot move: to file, to rank, from file, from rank in 3 bits each, then the promotion piece,
+# castling is written as the king taking its own rook
+def encode_move(move):
+    end_col = move.end_col
+    if move.is_castle_move:
+        end_col = 7 if move.end_col > move.start_col else 0
+    promotion = PROMOTION_CODES[move.promotion_choice] if move.is_pawn_promotion else 0
+    return end_col | ((7 - move.end_row) << 3) | (move.start_col << 6) | ((7 - move.start_row) << 9) | (promotion << 12)
+
+class OpeningBook:
+    def __init__(self, path = BOOK_PATH):
+        self.path = path
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        if size % ENTRY.size:
+            self.file.close()
+            raise ValueError(f"{path}: size {size} is not a multiple of {ENTRY.size} byte entries")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b"" # an empty file cannot be mapped
+        self.entries = size // ENTRY.size
+
+    def __len__(self):
+        return self.entries
+
+    # first entry with a key not smaller than key
+    def find(self, key):
+        low, high = 0, self.entries
+        while low < high:
+            middle = (low + high) // 2
+            if KEY.unpack_from(self.data, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    # (move, weight, learn) of every entry of the position key, heaviest first
+    def get_entries(self, key):
+        entries = []
+        index = self.find(key)
+        while index < self.entries:
+            entry_key, move, weight, learn = ENTRY.unpack_from(self.data, index * ENTRY.size)
+            if entry_key != key:
+                break
+            entries.append((move, weight, learn))
+            index += 1
+        return entries
+
+    # (Move, weight) of the book moves that are legal in gs, moves are the valid moves if they were generated already
+    def get_moves(self, gs, moves = None):
+        entries = self.get_entries(gs.position_key)
+        if not entries:
+            return []
+        if moves is None:
+            checkmate, stalemate, in_check = gs.checkmate, gs.stalemate, gs.in_check
+            moves = gs.get_valid_moves()
+            gs.checkmate, gs.stalemate, gs.in_check = checkmate, stalemate, in_check
+        legal = {encode_move(move): move for move in moves} # a key collision cannot make the engine play an illegal move
+        return [(legal[move], weight) for move, weight, _ in entries if move in legal and weight > 0]
+
+    # random book move with probability by weight, None when the position is not in the book
+    def choose_move(self, gs, moves = None, rng = random):
+        book_moves = self.get_moves(gs, moves)
+        if not book_moves:
+            return None
+        return rng.choices([move for move, _ in book_moves], [weight for _, weight in book_moves])[0]
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+# counts the moves of the first max_plies plies of every game, a move scores 2 for a win of the side that played it,
+# 1 for a draw and 0 for a loss, games stop counting at their first illegal move
+def collect_moves(paths, max_plies = 20):
+    counts = {} # (key, move) -> [score, games]
+    games = 0
+    for path in paths:
+        with open(path, "rb") as file:
+            for game in pgn.read_games(file):
+                games += 1
+                gs = chess_engine.GameState("list", 0, game.headers.get("FEN"))
+                for san in game.moves[:max_plies]:
+                    try:
+                        move = chess_engine.Move.from_san(gs, san)
+                    except ValueError:
+                        break
+                    if game.result == "1/2-1/2":
+                        score = 1
+                    elif game.result == ("1-0" if gs.white_to_move else "0-1"):
+                        score = 2
+                    else:
+                        score = 0
+                    count = counts.setdefault((gs.position_key, encode_move(move)), [0, 0])
+                    count[0] += score
+                    count[1] += 1
+                    gs.make_move(move)
+    return counts, games
+
+# writes the sorted book, moves played in fewer than min_games games or never scoring are left out
+def write_book(path, counts, min_games = 1):
+    entries = [(key, move, score) for (key, move), (score, games) in counts.items() if games >= min_games and score > 0]
+    highest = max((score for _, _, score in entries), default=0)
+    scale = MAX_WEIGHT / highest if highest > MAX_WEIGHT else 1 # weights are 16 bit, keep their ratios
+    entries.sort(key=lambda entry: (entry[0], -entry[2], entry[1]))
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "wb") as file:
+        for key, move, score in entries:
+            file.write(ENTRY.pack(key, move, max(int(score * scale), 1), 0))
+    return len(entries)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and probe opening books")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="compile a book from PGN files")
+    build.add_argument("book")
+    build.add_argument("pgn", nargs="+")
+    build.add_argument("--max-plies", type=int, default=20, help="plies of every game that go into the book")
+    build.add_argument("--min-games", type=int, default=1, help="games a move needs to be played in to be kept")
+    probe = commands.add_parser("probe", help="list the book moves of a position")
+    probe.add_argument("book")
+    probe.add_argument("fen", nargs="*", help="position, the start position by default")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        counts, games = collect_moves(args.pgn, args.max_plies)
+        entries = write_book(args.book, counts, args.min_games)
+        print(f"{games} games, {entries} entries written to {args.book} in {time.perf_counter() - start:.1f}s")
+        return
+
+    book = OpeningBook(args.book)
+    gs = chess_engine.GameState("list", 0, " ".join(args.fen) or None)
+    start = time.perf_counter()
+    entries = book.get_entries(gs.position_key)
+    elapsed = time.perf_counter() - start
+    total = sum(weight for _, weight, _ in entries)
+    for move, weight in book.get_moves(gs):
+        print(f"{move.get_chess_notation():6} {move.get_san(gs):8} weight {weight:6} {weight / total:7.1%}")
+    print(f"{len(entries)} of {len(book)} entries, lookup {elapsed * 1e6:.1f}us")
+    book.close()
+
+if __name__ == "__main__":
+    main()
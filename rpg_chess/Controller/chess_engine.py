@@ -1,5 +1,15 @@
+import re
+from array import array
+from rpg_chess.Controller import bitboard
+from rpg_chess.Controller import evaluation
+from rpg_chess.Controller import zobrist
+from rpg_chess.Data import piece as piece_classes
+
 class GameState:
-    def __init__(self):
+    # backend "list" generates moves on the board of strings, "bitboard" keeps 64 bit boards next to it and generates from those,
+    # "classes" gives every piece an RPG class (see assign_class) and generates from the compiled tables of the classes
+    # move_cache_size is the number of positions whose legal moves are remembered, 0 turns the cache off
+    def __init__(self, backend = "list", move_cache_size = 256, fen = None):
         self.board = [
             ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
             ["bP", "bP", "bP", "bP", "bP", "bP", "bP", "bP"],
@@ -20,14 +30,154 @@ class GameState:
         self.stalemate = False
         self.enpassant_possible = () # coordinates where an enpassant capture is possible
         self.current_castling_rights = CastleRights(True, True, True, True)
-        self.castle_rights_log = [CastleRights(self.current_castling_rights.white_king_side, self.current_castling_rights.black_king_side,
-                                               self.current_castling_rights.white_queen_side, self.current_castling_rights.black_queen_side)]
+        self.state_log = array("H") # get_packed_state before every move of move_log, what undo_move cannot read off the move
+        self.in_check = False
+        self.pins = {} # (row, col) of a pinned ally piece -> (dir_row, dir_col) from the king towards the pinning piece
+        self.checks = [] # (row, col, dir_row, dir_col) of every piece giving check
+        self.class_board = None # PieceClass of every piece with the classes backend
+        if backend == "bitboard":
+            self.bitboards = bitboard.Bitboards(self.board)
+        elif backend == "list":
+            self.bitboards = None
+        elif backend == "classes":
+            self.bitboards = None
+            self.reset_classes()
+        else:
+            raise ValueError(f"Unknown backend {backend}")
+        self.start_halfmove_clock = 0 # FEN move counters of the starting position, the current ones are derived from move_log
+        self.start_fullmove_number = 1
+        self.start_white_to_move = True
+        self.position_key = zobrist.compute_key(self) # 64 bit zobrist key, updated by make_move and undo_move
+        self.position_key_log = [self.position_key]
+        # [white, black] material + piece-square scores and the game phase, updated by make_move and undo_move
+        self.midgame_scores, self.endgame_scores, self.phase = evaluation.compute_scores(self.board)
+        self.move_cache = zobrist.TranspositionTable(move_cache_size) if move_cache_size > 0 else None
+        if fen is not None:
+            self.load_fen(fen)
+
+    # set up the position of a FEN string, the move history is cleared
+    def load_fen(self, fen):
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError(f"Invalid FEN {fen}")
+        board = []
+        for rank in fields[0].split("/"):
+            row = []
+            for char in rank:
+                if char.isdigit():
+                    row.extend(["--"] * int(char))
+                elif char.upper() in self.move_functions:
+                    row.append(("w" if char.isupper() else "b") + char.upper())
+                else:
+                    raise ValueError(f"Invalid piece {char} in FEN {fen}")
+            if len(row) != 8:
+                raise ValueError(f"Invalid rank {rank} in FEN {fen}")
+            board.append(row)
+        if len(board) != 8:
+            raise ValueError(f"Invalid FEN {fen}")
+        kings = {"wK": [], "bK": []}
+        for row in range(8):
+            for col in range(8):
+                if board[row][col] in kings:
+                    kings[board[row][col]].append((row, col))
+        if len(kings["wK"]) != 1 or len(kings["bK"]) != 1:
+            raise ValueError(f"FEN {fen} needs exactly one king per side")
+        if fields[1] not in ("w", "b"):
+            raise ValueError(f"Invalid side to move {fields[1]} in FEN {fen}")
+        # the square behind a pawn that just moved two squares, so rank 6 with white to move and rank 3 with black to move
+        if fields[3] != "-" and (len(fields[3]) != 2 or fields[3][0] not in Move.files_to_cols or fields[3][1] != ("6" if fields[1] == "w" else "3")):
+            raise ValueError(f"Invalid en passant square {fields[3]} in FEN {fen}")
+
+        self.board = board
+        self.white_to_move = fields[1] == "w"
+        self.white_king_location = kings["wK"][0]
+        self.black_king_location = kings["bK"][0]
+        self.current_castling_rights = CastleRights("K" in fields[2], "k" in fields[2], "Q" in fields[2], "q" in fields[2])
+        if fields[3] == "-":
+            self.enpassant_possible = ()
+        else:
+            self.enpassant_possible = (Move.ranks_to_rows[fields[3][1]], Move.files_to_cols[fields[3][0]])
+        self.state_log = array("H")
+        self.move_log = []
+        self.checkmate = False
+        self.stalemate = False
+        self.start_halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+        self.start_fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+        self.start_white_to_move = self.white_to_move
+        if self.bitboards is not None:
+            self.bitboards = bitboard.Bitboards(self.board)
+        if self.class_board is not None:
+            self.reset_classes()
+        self.position_key = zobrist.compute_key(self)
+        self.position_key_log = [self.position_key]
+        self.midgame_scores, self.endgame_scores, self.phase = evaluation.compute_scores(self.board)
+
+    def get_fen(self):
+        ranks = []
+        for row in self.board:
+            rank = ""
+            empty = 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += piece[1] if piece[0] == "w" else piece[1].lower()
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+
+        rights = self.current_castling_rights
+        castling = ("K" if rights.white_king_side else "") + ("Q" if rights.white_queen_side else "") + \
+                   ("k" if rights.black_king_side else "") + ("q" if rights.black_queen_side else "")
+        if self.enpassant_possible == ():
+            enpassant = "-"
+        else:
+            enpassant = Move.cols_to_files[self.enpassant_possible[1]] + Move.rows_to_ranks[self.enpassant_possible[0]]
+
+        fullmove_number = self.start_fullmove_number + (len(self.move_log) + (0 if self.start_white_to_move else 1)) // 2
+        return f"{'/'.join(ranks)} {'w' if self.white_to_move else 'b'} {castling or '-'} {enpassant} {self.get_halfmove_clock()} {fullmove_number}"
+
+    # half moves since the last capture or pawn move, at 100 the fifty move rule applies
+    def get_halfmove_clock(self):
+        halfmove_clock = 0
+        for move in reversed(self.move_log):
+            if move.piece_moved[1] == "P" or move.piece_captured != "--":
+                return halfmove_clock
+            halfmove_clock += 1
+        return halfmove_clock + self.start_halfmove_clock # no irreversible move since the starting position
+
+    # castling rights in bits 0-3 (in zobrist.get_castle_rights_index order) and the en passant column + 1 in bits 4-6,
+    # the captured piece is kept by the move itself and the piece classes by class_log
+    def get_packed_state(self):
+        state = zobrist.get_castle_rights_index(self.current_castling_rights)
+        if self.enpassant_possible != ():
+            state |= (self.enpassant_possible[1] + 1) << 4
+        return state
+
+    # the castling rights are changed in place, white_to_move must already be the side to move of the state
+    def set_packed_state(self, state):
+        rights = self.current_castling_rights
+        rights.white_king_side = bool(state & 1)
+        rights.white_queen_side = bool(state & 2)
+        rights.black_king_side = bool(state & 4)
+        rights.black_queen_side = bool(state & 8)
+        column = state >> 4
+        if column:
+            self.enpassant_possible = (2 if self.white_to_move else 5, column - 1) # the square the pawn skipped
+        else:
+            self.enpassant_possible = ()
 
     def get_flipped_board(self): # not used currently
         return [row[::-1] for row in self.board[::-1]]
 
     # takes a move and does it, not working for en passant, castling or pawn promotion
     def make_move(self, move):
+        old_enpassant_key = zobrist.get_enpassant_key(self.board, self.enpassant_possible, self.white_to_move)
+        old_state = self.get_packed_state()
+        self.state_log.append(old_state)
         self.board[move.start_row][move.start_col] = "--"
         self.board[move.end_row][move.end_col] = move.piece_moved
         self.move_log.append(move) # keep log so we can undo
@@ -40,7 +190,7 @@ class GameState:
 
         # pawn promotion move
         if move.is_pawn_promotion:
-            self.board[move.end_row][move.end_col] = move.piece_moved[0] + "Q"
+            self.board[move.end_row][move.end_col] = move.piece_moved[0] + move.promotion_choice
 
         # enpassant move
         if move.is_enpassant:
@@ -63,8 +213,32 @@ class GameState:
 
         # update castling permissions - rook or king move
         self.update_castle_rights(move)
-        self.castle_rights_log.append((CastleRights(self.current_castling_rights.white_king_side, self.current_castling_rights.black_king_side,
-                                               self.current_castling_rights.white_queen_side, self.current_castling_rights.black_queen_side)))
+        if self.bitboards is not None:
+            self.bitboards.make_move(move)
+
+        # update the position key by xoring out what left a square and xoring in what arrived
+        piece_keys = zobrist.PIECE_KEYS
+        end = move.end_row * 8 + move.end_col
+        key = self.position_key ^ zobrist.BLACK_TO_MOVE_KEY
+        key ^= piece_keys[move.piece_moved][move.start_row * 8 + move.start_col] ^ piece_keys[self.board[move.end_row][move.end_col]][end]
+        if move.is_enpassant:
+            key ^= piece_keys[move.piece_captured][move.start_row * 8 + move.end_col]
+        elif move.piece_captured != "--":
+            key ^= piece_keys[move.piece_captured][end]
+        if move.is_castle_move:
+            rook_keys = piece_keys[move.piece_moved[0] + "R"]
+            if move.end_col - move.start_col == 2: # kingside
+                key ^= rook_keys[end + 1] ^ rook_keys[end - 1]
+            else: # queenside
+                key ^= rook_keys[end - 2] ^ rook_keys[end + 1]
+        key ^= zobrist.CASTLE_KEYS[old_state & 15]
+        key ^= zobrist.CASTLE_KEYS[zobrist.get_castle_rights_index(self.current_castling_rights)]
+        key ^= old_enpassant_key ^ zobrist.get_enpassant_key(self.board, self.enpassant_possible, self.white_to_move)
+        self.position_key = key
+        self.position_key_log.append(key)
+        self.update_scores(move, 1)
+        if self.class_board is not None:
+            self.move_classes(move)
 
     # undo last move
     def undo_move(self):
@@ -83,16 +257,9 @@ class GameState:
             if move.is_enpassant:
                 self.board[move.end_row][move.end_col] = "--"
                 self.board[move.start_row][move.end_col] = move.piece_captured
-                self.enpassant_possible = (move.end_row, move.end_col)
-            # undo 2 square pawn advance
-            if move.piece_moved[1] == "P" and abs(move.start_row - move.end_row) == 2:
-                self.enpassant_possible = ()
-            
-            # undo castling rights
-            self.castle_rights_log.pop() # get rid of new castle rights
-            new_rights = self.castle_rights_log[-1] # set the castle rights to the onces from previous turn
-            self.current_castling_rights = CastleRights(new_rights.white_king_side, new_rights.black_king_side,
-                                                        new_rights.white_queen_side, new_rights.black_queen_side)
+
+            # castling rights and the enpassant square from before the move
+            self.set_packed_state(self.state_log.pop())
 
             # undo castle move
             if move.is_castle_move:
@@ -102,63 +269,685 @@ class GameState:
                 else: # queenside
                     self.board[move.end_row][move.end_col - 2] = self.board[move.end_row][move.end_col + 1]
                     self.board[move.end_row][move.end_col + 1] = "--"
+
+            if self.bitboards is not None:
+                self.bitboards.undo_move(move)
+
+            self.position_key_log.pop()
+            self.position_key = self.position_key_log[-1]
+            self.update_scores(move, -1)
+            if self.class_board is not None:
+                self.undo_classes(move)
+
+    # add (sign 1) or take back (sign -1) the evaluation change of a move: the moving piece, a capture, a promotion and the castling rook
+    def update_scores(self, move, sign):
+        midgame_tables = evaluation.MIDGAME_TABLES
+        endgame_tables = evaluation.ENDGAME_TABLES
+        side = 0 if move.piece_moved[0] == "w" else 1
+        start = move.start_row * 8 + move.start_col
+        end = move.end_row * 8 + move.end_col
+        arrived = move.piece_moved[0] + move.promotion_choice if move.is_pawn_promotion else move.piece_moved
+        midgame = midgame_tables[arrived][end] - midgame_tables[move.piece_moved][start]
+        endgame = endgame_tables[arrived][end] - endgame_tables[move.piece_moved][start]
+        if move.is_pawn_promotion:
+            self.phase += sign * evaluation.PHASE_WEIGHTS[move.promotion_choice]
+        if move.is_castle_move:
+            rook = move.piece_moved[0] + "R"
+            if move.end_col - move.start_col == 2: # kingside
+                rook_start, rook_end = end + 1, end - 1
+            else: # queenside
+                rook_start, rook_end = end - 2, end + 1
+            midgame += midgame_tables[rook][rook_end] - midgame_tables[rook][rook_start]
+            endgame += endgame_tables[rook][rook_end] - endgame_tables[rook][rook_start]
+        self.midgame_scores[side] += sign * midgame
+        self.endgame_scores[side] += sign * endgame
+        if move.piece_captured != "--":
+            captured_square = move.start_row * 8 + move.end_col if move.is_enpassant else end
+            self.midgame_scores[1 - side] -= sign * midgame_tables[move.piece_captured][captured_square]
+            self.endgame_scores[1 - side] -= sign * endgame_tables[move.piece_captured][captured_square]
+            self.phase -= sign * evaluation.PHASE_WEIGHTS[move.piece_captured[1]]
     
+    # every piece gets the class of its plain chess piece, the move history of classes is cleared
+    def reset_classes(self):
+        self.class_board = [[piece_classes.STANDARD_CLASSES[square[1]] if square != "--" else None for square in row] for row in self.board]
+        self.class_log = [] # (class of the moved piece, class of the captured piece) per move
+        self.leap_offsets = set(piece_classes.KNIGHT_JUMPS) | set(piece_classes.KING_JUMPS) # every jump some class on the board can make
+        self.attack_directions = set(piece_classes.KING_JUMPS) # every slide some class on the board makes, seen from the attacked square
+
+    # give the piece on the square an RPG class of its type, only with the classes backend
+    def assign_class(self, row, col, piece_class):
+        if self.class_board is None:
+            raise ValueError("Classes need GameState(backend=\"classes\")")
+        if self.board[row][col][1:] != piece_class.piece_type:
+            raise ValueError(f"Class {piece_class.name} is for {piece_class.piece_type} pieces, not {self.board[row][col]}")
+        old_class = self.class_board[row][col]
+        self.class_board[row][col] = piece_class
+        self.leap_offsets |= piece_class.leaps
+        self.attack_directions |= piece_class.attack_ranges.keys()
+        self.position_key ^= old_class.keys[row * 8 + col] ^ piece_class.keys[row * 8 + col]
+        self.position_key_log[-1] = self.position_key
+        if self.move_cache is not None:
+            self.move_cache.clear()
+
+    # classes travel with their pieces, the key changes by the class keys, plain classes have zero keys
+    def move_classes(self, move):
+        class_board = self.class_board
+        start = move.start_row * 8 + move.start_col
+        end = move.end_row * 8 + move.end_col
+        moved_class = class_board[move.start_row][move.start_col]
+        if move.is_enpassant:
+            captured_class = class_board[move.start_row][move.end_col]
+            class_board[move.start_row][move.end_col] = None
+        else:
+            captured_class = class_board[move.end_row][move.end_col]
+        class_board[move.start_row][move.start_col] = None
+        arrived_class = piece_classes.STANDARD_CLASSES[move.promotion_choice] if move.is_pawn_promotion else moved_class
+        class_board[move.end_row][move.end_col] = arrived_class
+        key = self.position_key ^ moved_class.keys[start] ^ arrived_class.keys[end]
+        if captured_class is not None and not move.is_enpassant:
+            key ^= captured_class.keys[end]
+        if move.is_castle_move:
+            if move.end_col - move.start_col == 2: # kingside
+                rook_start, rook_end = move.end_col + 1, move.end_col - 1
+            else: # queenside
+                rook_start, rook_end = move.end_col - 2, move.end_col + 1
+            rook_class = class_board[move.end_row][rook_start]
+            class_board[move.end_row][rook_end] = rook_class
+            class_board[move.end_row][rook_start] = None
+            key ^= rook_class.keys[move.end_row * 8 + rook_start] ^ rook_class.keys[move.end_row * 8 + rook_end]
+        self.class_log.append((moved_class, captured_class))
+        self.position_key = key
+        self.position_key_log[-1] = key
+
+    def undo_classes(self, move):
+        class_board = self.class_board
+        moved_class, captured_class = self.class_log.pop()
+        class_board[move.start_row][move.start_col] = moved_class
+        if move.is_enpassant:
+            class_board[move.end_row][move.end_col] = None
+            class_board[move.start_row][move.end_col] = captured_class
+        else:
+            class_board[move.end_row][move.end_col] = captured_class
+        if move.is_castle_move:
+            if move.end_col - move.start_col == 2: # kingside
+                rook_start, rook_end = move.end_col + 1, move.end_col - 1
+            else: # queenside
+                rook_start, rook_end = move.end_col - 2, move.end_col + 1
+            class_board[move.end_row][rook_start] = class_board[move.end_row][rook_end]
+            class_board[move.end_row][rook_end] = None
+
+    # the current position appeared at least three times with the same player to move
+    def is_threefold_repetition(self):
+        return self.is_repetition(3)
+
+    # the current position appeared "times" times or more, the search already treats the first repetition as a draw
+    def is_repetition(self, times = 2):
+        count = 1
+        current = len(self.position_key_log) - 1
+        index = current
+        # positions before the last capture or pawn move can never appear again
+        while index > 0 and self.move_log[index - 1].piece_moved[1] != "P" and self.move_log[index - 1].piece_captured == "--":
+            index -= 1
+            if (current - index) % 2 == 0 and self.position_key_log[index] == self.position_key:
+                count += 1
+                if count == times:
+                    return True
+        return False
+
     def is_king_in_check(self):
         if self.white_to_move:
             return self.is_square_under_attack(self.white_king_location[0], self.white_king_location[1])
         else:
             return self.is_square_under_attack(self.black_king_location[0], self.black_king_location[1])
 
+    # look outward from the square for an enemy attacker, no moves are generated
     def is_square_under_attack(self, row, col):
-        self.white_to_move = not self.white_to_move # to check we must generate opponents moves
-        opponent_moves = self.get_all_possible_moves()
-        self.white_to_move = not self.white_to_move
+        board = self.board
+        enemy_color = "b" if self.white_to_move else "w"
+        if self.bitboards is not None:
+            return self.bitboards.is_square_attacked(row * 8 + col, enemy_color)
+        if self.class_board is not None:
+            return self.is_square_under_attack_classes(row, col, enemy_color)
+
+        for d in ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)): # knight jumps
+            end_row = row + d[0]
+            end_col = col + d[1]
+            if 0 <= end_row <= 7 and 0 <= end_col <= 7 and board[end_row][end_col] == enemy_color + "N":
+                return True
+
+        pawn_row = row - 1 if self.white_to_move else row + 1 # black pawns attack downwards, white pawns upwards
+        if 0 <= pawn_row <= 7:
+            if col - 1 >= 0 and board[pawn_row][col - 1] == enemy_color + "P":
+                return True
+            if col + 1 <= 7 and board[pawn_row][col + 1] == enemy_color + "P":
+                return True
 
-        for move in opponent_moves:
-            if move.end_row == row and move.end_col == col: # is square under attack 
+        for d in ((-1, 0), (0, -1), (1, 0), (0, 1)): # rook and queen rays, king neighbours
+            end_row = row + d[0]
+            end_col = col + d[1]
+            if 0 <= end_row <= 7 and 0 <= end_col <= 7 and board[end_row][end_col] == enemy_color + "K":
+                return True
+            while 0 <= end_row <= 7 and 0 <= end_col <= 7:
+                end_piece = board[end_row][end_col]
+                if end_piece != "--":
+                    if end_piece[0] == enemy_color and (end_piece[1] == "R" or end_piece[1] == "Q"):
+                        return True
+                    break
+                end_row += d[0]
+                end_col += d[1]
+
+        for d in ((-1, -1), (-1, 1), (1, -1), (1, 1)): # bishop and queen rays, king neighbours
+            end_row = row + d[0]
+            end_col = col + d[1]
+            if 0 <= end_row <= 7 and 0 <= end_col <= 7 and board[end_row][end_col] == enemy_color + "K":
                 return True
+            while 0 <= end_row <= 7 and 0 <= end_col <= 7:
+                end_piece = board[end_row][end_col]
+                if end_piece != "--":
+                    if end_piece[0] == enemy_color and (end_piece[1] == "B" or end_piece[1] == "Q"):
+                        return True
+                    break
+                end_row += d[0]
+                end_col += d[1]
         return False
 
-    # All valid moves
-    def get_valid_moves(self):
-        temp_enpassant_possible = self.enpassant_possible # store info about enpassant and castle in current position
-        temp_castle_rights = CastleRights(self.current_castling_rights.white_king_side, self.current_castling_rights.black_king_side,
-                                          self.current_castling_rights.white_queen_side, self.current_castling_rights.black_queen_side)
+    # same as is_square_under_attack for pieces with classes: every jump any class makes is tried backwards from the square,
+    # and every ray from the square is walked to the first piece, whose class must slide the other way far enough
+    def is_square_under_attack_classes(self, row, col, enemy_color):
+        board = self.board
+        class_board = self.class_board
+        for dr, dc in self.leap_offsets:
+            start_row = row - dr
+            start_col = col - dc
+            if 0 <= start_row <= 7 and 0 <= start_col <= 7 and board[start_row][start_col][0] == enemy_color:
+                if (dr, dc) in class_board[start_row][start_col].leaps:
+                    return True
 
-        # all moves + considering king in check for next turn, greedy algorithm explained with numbers
-        moves = self.get_all_possible_moves() # 1) generate all possible moves
+        pawn_row = row - 1 if enemy_color == "b" else row + 1 # black pawns attack downwards, white pawns upwards
+        if 0 <= pawn_row <= 7:
+            if col - 1 >= 0 and board[pawn_row][col - 1] == enemy_color + "P":
+                return True
+            if col + 1 <= 7 and board[pawn_row][col + 1] == enemy_color + "P":
+                return True
+
+        for d in self.attack_directions:
+            end_row = row + d[0]
+            end_col = col + d[1]
+            distance = 1
+            while 0 <= end_row <= 7 and 0 <= end_col <= 7:
+                end_piece = board[end_row][end_col]
+                if end_piece != "--":
+                    if end_piece[0] == enemy_color and class_board[end_row][end_col].attack_ranges.get(d, 0) >= distance:
+                        return True
+                    break
+                end_row += d[0]
+                end_col += d[1]
+                distance += 1
+        return False
+
+    # 8x8 map of every square the opponent attacks, from the same knight, king, pawn and ray walks as is_square_under_attack
+    # but starting at the attackers, so one pass answers many squares (castling paths, king escape squares, displays)
+    # sliding attacks go through our king so it cannot step back along a check, no Move is created
+    def get_attack_map(self):
+        enemy_color, ally_king = ("b", "wK") if self.white_to_move else ("w", "bK")
+        if self.bitboards is not None:
+            king_row, king_col = self.white_king_location if self.white_to_move else self.black_king_location
+            occupied = (self.bitboards.colors["w"] | self.bitboards.colors["b"]) & ~bitboard.get_square_bit(king_row, king_col)
+            attacked = self.bitboards.get_attacked_squares(enemy_color, occupied)
+            return [[bool(attacked >> (row * 8 + col) & 1) for col in range(8)] for row in range(8)]
 
+        board = self.board
+        class_board = self.class_board
+        attacked = [[False] * 8 for _ in range(8)]
+        pawn_direction = 1 if self.white_to_move else -1 # enemy pawns attack towards our side
+        for row in range(8):
+            for col in range(8):
+                piece = board[row][col]
+                if piece[0] != enemy_color:
+                    continue
+                piece_type = piece[1]
+                if piece_type == "P":
+                    end_row = row + pawn_direction
+                    if 0 <= end_row <= 7:
+                        if col - 1 >= 0:
+                            attacked[end_row][col - 1] = True
+                        if col + 1 <= 7:
+                            attacked[end_row][col + 1] = True
+                elif class_board is not None: # jumps and rays of the piece's class
+                    piece_class = class_board[row][col]
+                    square = row * 8 + col
+                    for end_row, end_col in piece_class.leap_targets[square]:
+                        attacked[end_row][end_col] = True
+                    for (end_row, end_col), _ in piece_class.covered_leaps[square]: # the ray or the jump reaches it
+                        attacked[end_row][end_col] = True
+                    for ray in piece_class.rays[square]:
+                        for end_row, end_col in ray:
+                            attacked[end_row][end_col] = True
+                            end_piece = board[end_row][end_col]
+                            if end_piece != "--" and end_piece != ally_king: # the ray stops at the first piece
+                                break
+                elif piece_type == "N" or piece_type == "K":
+                    jumps = piece_classes.KNIGHT_JUMPS if piece_type == "N" else piece_classes.KING_JUMPS
+                    for d in jumps:
+                        end_row = row + d[0]
+                        end_col = col + d[1]
+                        if 0 <= end_row <= 7 and 0 <= end_col <= 7:
+                            attacked[end_row][end_col] = True
+                else:
+                    if piece_type == "R":
+                        directions = piece_classes.ROOK_DIRECTIONS
+                    elif piece_type == "B":
+                        directions = piece_classes.BISHOP_DIRECTIONS
+                    else:
+                        directions = piece_classes.KING_JUMPS
+                    for d in directions:
+                        end_row = row + d[0]
+                        end_col = col + d[1]
+                        while 0 <= end_row <= 7 and 0 <= end_col <= 7:
+                            attacked[end_row][end_col] = True
+                            end_piece = board[end_row][end_col]
+                            if end_piece != "--" and end_piece != ally_king: # the ray stops at the first piece
+                                break
+                            end_row += d[0]
+                            end_col += d[1]
+        return attacked
+
+    # look outward from our king and find the enemy pieces giving check and the ally pieces pinned to it
+    def check_for_pins_and_checks(self):
+        pins = {}
+        checks = []
+        in_check = False
         if self.white_to_move:
-            self.get_castle_moves(self.white_king_location[0], self.white_king_location[1], moves)
+            enemy_color, ally_color = "b", "w"
+            king_row, king_col = self.white_king_location
         else:
-            self.get_castle_moves(self.black_king_location[0], self.black_king_location[1], moves)
-
-        # 2) for each move we make the move
-        for i in range(len(moves)- 1, -1, -1): # when removing iterate from back to avoid index bugs
+            enemy_color, ally_color = "w", "b"
+            king_row, king_col = self.black_king_location
 
-            self.make_move(moves[i])
-            self.white_to_move = not self.white_to_move # after we make a move switch color so we generate opponent moves
+        # directions 0-3 are for rooks and queens, 4-7 for bishops and queens
+        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+        pawn_row = -1 if self.white_to_move else 1 # enemy pawns attack the king from this row direction
+        for j in range(len(directions)):
+            d = directions[j]
+            possible_pin = ()
+            for i in range(1, 8):
+                end_row = king_row + d[0] * i
+                end_col = king_col + d[1] * i
+                if not (0 <= end_row <= 7 and 0 <= end_col <= 7): # out of bounds
+                    break
+                end_piece = self.board[end_row][end_col]
+                if end_piece == "--":
+                    continue
+                if end_piece[0] == ally_color:
+                    if possible_pin == (): # first ally piece in this direction could be pinned
+                        possible_pin = (end_row, end_col)
+                    else: # second ally piece, no check or pin from this direction
+                        break
+                elif end_piece[0] == enemy_color:
+                    piece_type = end_piece[1]
+                    if (0 <= j <= 3 and piece_type == "R") or (4 <= j <= 7 and piece_type == "B") or piece_type == "Q" or \
+                            (i == 1 and piece_type == "K") or (i == 1 and piece_type == "P" and d[0] == pawn_row and j >= 4):
+                        if possible_pin == (): # no piece in between, it is a check
+                            in_check = True
+                            checks.append((end_row, end_col, d[0], d[1]))
+                        else: # ally piece in between, it is pinned
+                            pins[possible_pin] = d
+                    break # enemy piece that does not attack in this direction blocks the ray
 
-            # 3) generate all opponent moves and check if they attack the opposing king
-            if self.is_king_in_check():
-                moves.remove(moves[i]) # 4) not valid move so we remove it
+        knight_moves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+        for m in knight_moves:
+            end_row = king_row + m[0]
+            end_col = king_col + m[1]
+            if 0 <= end_row <= 7 and 0 <= end_col <= 7:
+                end_piece = self.board[end_row][end_col]
+                if end_piece[0] == enemy_color and end_piece[1] == "N": # knight attacks the square
+                    in_check = True
+                    checks.append((end_row, end_col, m[0], m[1]))
+        return in_check, pins, checks
 
-            self.white_to_move = not self.white_to_move # we go to other color so when we undo we keep the right player turn
-            self.undo_move() # undo the move made in this scope
+    # All valid moves
+    def get_valid_moves(self):
+        cached = self.move_cache.probe(self.position_key) if self.move_cache is not None else None
+        if cached is not None: # position seen before, through a transposition or undo
+            moves, self.in_check = cached
+            moves = list(moves) # callers may reorder or change the list
+        else:
+            if self.bitboards is not None:
+                moves = self.get_valid_moves_bitboard()
+            elif self.class_board is not None:
+                moves = self.get_valid_moves_classes()
+            else:
+                moves = self.get_valid_moves_list()
+            if self.move_cache is not None:
+                self.move_cache.store(self.position_key, (tuple(moves), self.in_check))
 
         if len(moves) == 0: # we cannot move => checkmate or stalemate
-            if self.is_king_in_check():
+            if self.in_check:
                 self.checkmate = True
             else:
                 self.stalemate = True
         else: # if we undo a losing move
             self.checkmate = False
             self.stalemate = False
-            
-        self.enpassant_possible = temp_enpassant_possible # after undo reset enpassant and castling rights to initial state
-        self.current_castling_rights = temp_castle_rights
         return moves
 
+    # legal moves generated on the board of strings
+    def get_valid_moves_list(self):
+        # 1) find checks and pinned pieces by looking outward from our king
+        self.in_check, self.pins, self.checks = self.check_for_pins_and_checks()
+        if self.white_to_move:
+            king_row, king_col = self.white_king_location
+        else:
+            king_row, king_col = self.black_king_location
+
+        # 2) generate moves, the piece move functions already respect pins
+        if self.in_check and len(self.checks) > 1: # double check, only the king can move
+            moves = []
+            self.get_king_moves(king_row, king_col, moves)
+        else:
+            moves = self.get_all_possible_moves()
+
+        valid_squares = None # squares a non king piece can move to when blocking or capturing a single checker
+        if self.in_check and len(self.checks) == 1:
+            check_row, check_col, dir_row, dir_col = self.checks[0]
+            if self.board[check_row][check_col][1] == "N": # knight checks cannot be blocked
+                valid_squares = {(check_row, check_col)}
+            else:
+                valid_squares = set()
+                for i in range(1, 8):
+                    valid_squares.add((king_row + dir_row * i, king_col + dir_col * i))
+                    if (king_row + dir_row * i, king_col + dir_col * i) == (check_row, check_col): # stop at the checking piece
+                        break
+
+        # 3) keep only the moves that do not leave our king in check
+        valid_moves = []
+        for move in moves:
+            if move.piece_moved[1] == "K":
+                self.board[king_row][king_col] = "--" # lift the king so it cannot shield the square it moves to
+                attacked = self.is_square_under_attack(move.end_row, move.end_col)
+                self.board[king_row][king_col] = move.piece_moved
+                if attacked: # king cannot step into an attacked square
+                    continue
+            elif move.is_enpassant: # en passant removes two pawns from one rank, so verify it by playing it
+                if not self.is_legal_after_move(move):
+                    continue
+            elif valid_squares is not None and (move.end_row, move.end_col) not in valid_squares:
+                continue
+            valid_moves.append(move)
+        moves = valid_moves
+
+        if not self.in_check:
+            self.get_castle_moves(king_row, king_col, moves)
+        return moves
+
+    # legal moves generated from the bitboards
+    def get_valid_moves_bitboard(self):
+        legal_moves, self.in_check = self.bitboards.get_legal_moves(self.white_to_move, self.current_castling_rights, self.enpassant_possible)
+        coordinates = bitboard.SQUARE_COORDINATES
+        board = self.board
+        moves = []
+        for packed in legal_moves:
+            start, end, flag = bitboard.unpack_move(packed)
+            if flag == bitboard.NORMAL:
+                moves.append(Move(coordinates[start], coordinates[end], board))
+            elif flag in bitboard.PROMOTION_PIECES:
+                moves.append(Move(coordinates[start], coordinates[end], board, promotion_choice = bitboard.PROMOTION_PIECES[flag]))
+            else:
+                moves.append(Move(coordinates[start], coordinates[end], board, flag == bitboard.ENPASSANT, flag == bitboard.CASTLE))
+        return moves
+
+    # check_for_pins_and_checks for pieces with classes: checkers are found by trying every jump any class makes backwards
+    # from the king, checking sliders and pins by walking every slide direction in use out from the king
+    # returns in_check, pinned square -> squares the piece can move to without uncovering the king, and the squares a piece
+    # other than the king must move to so every check is answered (capture or block), None when not in check
+    def check_for_pins_and_checks_classes(self):
+        board = self.board
+        class_board = self.class_board
+        if self.white_to_move:
+            enemy_color, ally_color = "b", "w"
+            king_row, king_col = self.white_king_location
+        else:
+            enemy_color, ally_color = "w", "b"
+            king_row, king_col = self.black_king_location
+        checks = []
+        pinned = {}
+        valid_squares = None
+
+        for dr, dc in self.leap_offsets: # jumps cannot be blocked, only the capture answers them
+            start_row = king_row - dr
+            start_col = king_col - dc
+            if 0 <= start_row <= 7 and 0 <= start_col <= 7 and board[start_row][start_col][0] == enemy_color:
+                if (dr, dc) in class_board[start_row][start_col].leaps:
+                    checks.append((start_row, start_col, dr, dc))
+                    valid_squares = {(start_row, start_col)} if valid_squares is None else valid_squares & {(start_row, start_col)}
+
+        pawn_row = king_row - 1 if self.white_to_move else king_row + 1 # enemy pawns attack the king from this row
+        if 0 <= pawn_row <= 7:
+            for pawn_col in (king_col - 1, king_col + 1):
+                if 0 <= pawn_col <= 7 and board[pawn_row][pawn_col] == enemy_color + "P":
+                    checks.append((pawn_row, pawn_col, pawn_row - king_row, pawn_col - king_col))
+                    valid_squares = {(pawn_row, pawn_col)} if valid_squares is None else valid_squares & {(pawn_row, pawn_col)}
+
+        for d in self.attack_directions:
+            line = [] # squares from the king up to the piece found, the ones a check can be blocked on or a pinned piece can use
+            possible_pin = ()
+            end_row = king_row + d[0]
+            end_col = king_col + d[1]
+            while 0 <= end_row <= 7 and 0 <= end_col <= 7:
+                line.append((end_row, end_col))
+                end_piece = board[end_row][end_col]
+                if end_piece != "--":
+                    if end_piece[0] == ally_color:
+                        if possible_pin != (): # second ally piece, no check or pin from this direction
+                            break
+                        possible_pin = (end_row, end_col)
+                    else:
+                        if class_board[end_row][end_col].attack_ranges.get(d, 0) >= len(line):
+                            if possible_pin == (): # no piece in between, it is a check
+                                checks.append((end_row, end_col, d[0], d[1]))
+                                valid_squares = set(line) if valid_squares is None else valid_squares.intersection(line)
+                            else: # steps of different sizes can pin one piece twice, it keeps the squares both pins allow
+                                pinned[possible_pin] = pinned[possible_pin].intersection(line) if possible_pin in pinned else set(line)
+                        break
+                end_row += d[0]
+                end_col += d[1]
+        return len(checks) > 0, pinned, valid_squares, checks
+
+    # legal moves of pieces with classes, jumps and slides come from the class tables and are filtered with the checks and
+    # pins of check_for_pins_and_checks_classes, the pawn and king moves the same way get_valid_moves_list does
+    def get_valid_moves_classes(self):
+        self.in_check, pinned, valid_squares, self.checks = self.check_for_pins_and_checks_classes()
+        self.pins = {} # pinned pawns are filtered below with the other pinned pieces
+        board = self.board
+        class_board = self.class_board
+        if self.white_to_move:
+            ally_color = "w"
+            king_row, king_col = self.white_king_location
+        else:
+            ally_color = "b"
+            king_row, king_col = self.black_king_location
+        moves = []
+        if valid_squares is None or valid_squares: # no square answers every check of a double check, only the king moves
+            for row in range(8):
+                for col in range(8):
+                    if board[row][col][0] == ally_color:
+                        if board[row][col][1] == "P":
+                            self.get_pawn_moves(row, col, moves)
+                        else:
+                            self.get_class_moves(row, col, class_board[row][col], moves)
+        else:
+            self.get_class_moves(king_row, king_col, class_board[king_row][king_col], moves)
+
+        valid_moves = []
+        for move in moves:
+            if move.piece_moved[1] == "K":
+                board[king_row][king_col] = "--" # lift the king so it cannot shield the square it moves to
+                attacked = self.is_square_under_attack(move.end_row, move.end_col)
+                board[king_row][king_col] = move.piece_moved
+                if attacked: # king cannot step into an attacked square
+                    continue
+            elif move.is_enpassant: # en passant removes two pawns from one rank, so verify it by playing it
+                if not self.is_legal_after_move(move):
+                    continue
+            else:
+                if valid_squares is not None and (move.end_row, move.end_col) not in valid_squares:
+                    continue
+                pin_squares = pinned.get((move.start_row, move.start_col))
+                if pin_squares is not None and (move.end_row, move.end_col) not in pin_squares:
+                    continue
+            valid_moves.append(move)
+        moves = valid_moves
+
+        if not self.in_check:
+            self.get_castle_moves(king_row, king_col, moves)
+        return moves
+
+    # legal captures and promotions only, for quiescence search: pieces are walked like the move functions do, but only moves
+    # onto enemy pieces and pawn moves to the last row become Moves, so no quiet move is ever created
+    # in check every legal capture or promotion is taken from get_valid_moves, evasions are rare in quiescence
+    def get_capture_moves(self):
+        if self.bitboards is not None:
+            return self.get_capture_moves_bitboard()
+        if self.class_board is not None:
+            in_check, pinned = self.check_for_pins_and_checks_classes()[:2]
+        else:
+            in_check, pins, _ = self.check_for_pins_and_checks()
+            king_row, king_col = self.white_king_location if self.white_to_move else self.black_king_location
+            # a pinned piece stays on the line through the king and its pinner
+            pinned = {square: {(king_row + d[0] * i, king_col + d[1] * i) for i in range(1, 8)} for square, d in pins.items()}
+        if in_check:
+            return [move for move in self.get_valid_moves() if move.piece_captured != "--" or move.is_pawn_promotion]
+
+        board = self.board
+        class_board = self.class_board
+        if self.white_to_move:
+            ally_color, enemy_color, pawn_direction, last_row = "w", "b", -1, 0
+            king_row, king_col = self.white_king_location
+        else:
+            ally_color, enemy_color, pawn_direction, last_row = "b", "w", 1, 7
+            king_row, king_col = self.black_king_location
+        targets = [] # (start, end) of every capture before the pin test
+        moves = []
+        for row in range(8):
+            for col in range(8):
+                piece = board[row][col]
+                if piece[0] != ally_color:
+                    continue
+                piece_type = piece[1]
+                if piece_type == "P":
+                    end_row = row + pawn_direction
+                    for end_col in (col - 1, col + 1):
+                        if 0 <= end_col <= 7:
+                            if board[end_row][end_col][0] == enemy_color:
+                                targets.append(((row, col), (end_row, end_col)))
+                            elif (end_row, end_col) == self.enpassant_possible: # two pawns leave the rank, verify by playing it
+                                move = Move((row, col), (end_row, end_col), board, is_enpassant_move=True)
+                                if self.is_legal_after_move(move):
+                                    moves.append(move)
+                    if end_row == last_row and board[end_row][col] == "--": # quiet promotions change the material too
+                        targets.append(((row, col), (end_row, col)))
+                elif piece_type == "K":
+                    board[row][col] = "--" # lift the king so it cannot shield the square it moves to
+                    for d in piece_classes.KING_JUMPS:
+                        end_row = row + d[0]
+                        end_col = col + d[1]
+                        if 0 <= end_row <= 7 and 0 <= end_col <= 7 and board[end_row][end_col][0] == enemy_color:
+                            if not self.is_square_under_attack(end_row, end_col):
+                                targets.append(((row, col), (end_row, end_col)))
+                    board[row][col] = piece
+                elif class_board is not None: # jumps and rays of the piece's class
+                    piece_class = class_board[row][col]
+                    square = row * 8 + col
+                    for end_row, end_col in piece_class.leap_targets[square]:
+                        if board[end_row][end_col][0] == enemy_color:
+                            targets.append(((row, col), (end_row, end_col)))
+                    for (end_row, end_col), in_front in piece_class.covered_leaps[square]:
+                        if board[end_row][end_col][0] == enemy_color and any(board[front_row][front_col] != "--" for front_row, front_col in in_front):
+                            targets.append(((row, col), (end_row, end_col)))
+                    for ray in piece_class.rays[square]:
+                        for end_row, end_col in ray:
+                            if board[end_row][end_col] != "--":
+                                if board[end_row][end_col][0] == enemy_color:
+                                    targets.append(((row, col), (end_row, end_col)))
+                                break
+                elif piece_type == "N":
+                    for d in piece_classes.KNIGHT_JUMPS:
+                        end_row = row + d[0]
+                        end_col = col + d[1]
+                        if 0 <= end_row <= 7 and 0 <= end_col <= 7 and board[end_row][end_col][0] == enemy_color:
+                            targets.append(((row, col), (end_row, end_col)))
+                else:
+                    if piece_type == "R":
+                        directions = piece_classes.ROOK_DIRECTIONS
+                    elif piece_type == "B":
+                        directions = piece_classes.BISHOP_DIRECTIONS
+                    else:
+                        directions = piece_classes.KING_JUMPS
+                    for d in directions:
+                        end_row = row + d[0]
+                        end_col = col + d[1]
+                        while 0 <= end_row <= 7 and 0 <= end_col <= 7:
+                            if board[end_row][end_col] != "--":
+                                if board[end_row][end_col][0] == enemy_color:
+                                    targets.append(((row, col), (end_row, end_col)))
+                                break
+                            end_row += d[0]
+                            end_col += d[1]
+
+        for start, end in targets:
+            pin_squares = pinned.get(start)
+            if pin_squares is None or end in pin_squares:
+                if board[start[0]][start[1]][1] == "P":
+                    self.add_pawn_moves(start, end, moves)
+                else:
+                    moves.append(Move(start, end, board))
+        return moves
+
+    # the captures and promotions among the packed legal moves, only they become Moves
+    def get_capture_moves_bitboard(self):
+        legal_moves = self.bitboards.get_legal_moves(self.white_to_move, self.current_castling_rights, self.enpassant_possible)[0]
+        coordinates = bitboard.SQUARE_COORDINATES
+        board = self.board
+        moves = []
+        for packed in legal_moves:
+            start, end, flag = bitboard.unpack_move(packed)
+            if flag in bitboard.PROMOTION_PIECES:
+                moves.append(Move(coordinates[start], coordinates[end], board, promotion_choice = bitboard.PROMOTION_PIECES[flag]))
+            elif flag == bitboard.ENPASSANT:
+                moves.append(Move(coordinates[start], coordinates[end], board, is_enpassant_move=True))
+            elif flag == bitboard.NORMAL and board[end >> 3][end & 7] != "--":
+                moves.append(Move(coordinates[start], coordinates[end], board))
+        return moves
+
+    def get_class_moves(self, row, col, piece_class, moves):
+        board = self.board
+        ally_color = board[row][col][0]
+        square = row * 8 + col
+        for end_row, end_col in piece_class.leap_targets[square]:
+            if board[end_row][end_col][0] != ally_color:
+                moves.append(Move((row, col), (end_row, end_col), board))
+        for (end_row, end_col), in_front in piece_class.covered_leaps[square]: # jumps the ray only misses when it is blocked
+            if board[end_row][end_col][0] != ally_color and any(board[front_row][front_col] != "--" for front_row, front_col in in_front):
+                moves.append(Move((row, col), (end_row, end_col), board))
+        for ray in piece_class.rays[square]:
+            for end_row, end_col in ray:
+                end_piece = board[end_row][end_col]
+                if end_piece == "--":
+                    moves.append(Move((row, col), (end_row, end_col), board))
+                else:
+                    if end_piece[0] != ally_color:
+                        moves.append(Move((row, col), (end_row, end_col), board))
+                    break
+
+    # make the move, check if our king is attacked and undo it, only used for rare moves that pins cannot describe
+    def is_legal_after_move(self, move):
+        self.make_move(move)
+        self.white_to_move = not self.white_to_move
+        in_check = self.is_king_in_check()
+        self.white_to_move = not self.white_to_move
+        self.undo_move()
+        return not in_check
+
     # All moves, not considering king in check for next turn, returns list of moves
     def get_all_possible_moves(self):
         moves = []
@@ -172,47 +961,60 @@ class GameState:
         return moves
 
     def get_pawn_moves(self, row, col, moves):
+        pin_direction = self.pins.get((row, col)) # None if the pawn is not pinned
+
         if self.white_to_move:
 
-            if self.board[row - 1][col] == "--": # move 1 square forward
-                moves.append(Move((row, col), (row - 1, col), self.board))
+            if self.board[row - 1][col] == "--" and (pin_direction is None or pin_direction in ((-1, 0), (1, 0))): # move 1 square forward
+                self.add_pawn_moves((row, col), (row - 1, col), moves)
 
                 if row == 6 and self.board[row - 2][col] == "--": # move 2 squares if possible
                     moves.append(Move((row, col), (row - 2, col), self.board))
-            if col - 1 >= 0: # capture to the left
+            if col - 1 >= 0 and (pin_direction is None or pin_direction in ((-1, -1), (1, 1))): # capture to the left
                 if self.board[row - 1][col - 1][0] == "b":
-                    moves.append(Move((row, col), (row - 1, col - 1), self.board))
+                    self.add_pawn_moves((row, col), (row - 1, col - 1), moves)
                 elif (row - 1, col - 1) == self.enpassant_possible: # capture enpassant to the left
                     moves.append(Move((row, col), (row - 1, col - 1), self.board, is_enpassant_move=True))
-            if col + 1 <= 7: # capture to the right
+            if col + 1 <= 7 and (pin_direction is None or pin_direction in ((-1, 1), (1, -1))): # capture to the right
                 if self.board[row - 1][col + 1][0] == "b":
-                    moves.append(Move((row, col), (row - 1, col + 1), self.board))
+                    self.add_pawn_moves((row, col), (row - 1, col + 1), moves)
                 elif (row - 1, col + 1) == self.enpassant_possible: # capture enpassant to the right
                     moves.append(Move((row, col), (row - 1, col + 1), self.board, is_enpassant_move=True))
 
         else: # black to move
             
-            if self.board[row + 1][col] == "--": # move 1 square forward
-                moves.append(Move((row, col), (row + 1, col), self.board))
+            if self.board[row + 1][col] == "--" and (pin_direction is None or pin_direction in ((-1, 0), (1, 0))): # move 1 square forward
+                self.add_pawn_moves((row, col), (row + 1, col), moves)
 
                 if row == 1 and self.board[row + 2][col] == "--": # move 2 squares if possible
                     moves.append(Move((row, col), (row + 2, col), self.board))
-            if col - 1 >= 0: # capture to the left
+            if col - 1 >= 0 and (pin_direction is None or pin_direction in ((1, -1), (-1, 1))): # capture to the left
                 if self.board[row + 1][col - 1][0] == "w":
-                    moves.append(Move((row, col), (row + 1, col - 1), self.board))
+                    self.add_pawn_moves((row, col), (row + 1, col - 1), moves)
                 elif (row + 1, col - 1) == self.enpassant_possible: # capture enpassant to the left
                     moves.append(Move((row, col), (row + 1, col - 1), self.board, is_enpassant_move=True))
-            if col + 1 <= 7: # capture to the right
+            if col + 1 <= 7 and (pin_direction is None or pin_direction in ((1, 1), (-1, -1))): # capture to the right
                 if self.board[row + 1][col + 1][0] == "w":
-                    moves.append(Move((row, col), (row + 1, col + 1), self.board))
+                    self.add_pawn_moves((row, col), (row + 1, col + 1), moves)
                 elif (row + 1, col + 1) == self.enpassant_possible: # capture enpassant to the right
                     moves.append(Move((row, col), (row + 1, col + 1), self.board, is_enpassant_move=True))
 
+    # a pawn reaching the last row can promote to any of the four pieces
+    def add_pawn_moves(self, start_square, end_square, moves):
+        if end_square[0] == 0 or end_square[0] == 7:
+            for piece in ("Q", "R", "B", "N"):
+                moves.append(Move(start_square, end_square, self.board, promotion_choice = piece))
+        else:
+            moves.append(Move(start_square, end_square, self.board))
+
     def get_rook_moves(self, row, col, moves):
         directions = ((-1, 0), (0, -1), (1, 0), (0, 1)) # up, left, down, right
         enemy_color = "b" if self.white_to_move else "w"
+        pin_direction = self.pins.get((row, col))
 
         for d in directions:
+            if pin_direction is not None and d != pin_direction and d != (-pin_direction[0], -pin_direction[1]):
+                continue # a pinned piece can only slide along the pin
             for i in range(1, 8):
                 end_row = row + d[0] * i
                 end_col = col + d[1] * i
@@ -232,8 +1034,11 @@ class GameState:
     def get_bishop_moves(self, row, col, moves):
         directions = ((-1, -1), (-1, 1), (1, -1), (1, 1)) # up and left, up and right, down and left, down and right
         enemy_color = "b" if self.white_to_move else "w"
+        pin_direction = self.pins.get((row, col))
 
         for d in directions:
+            if pin_direction is not None and d != pin_direction and d != (-pin_direction[0], -pin_direction[1]):
+                continue # a pinned piece can only slide along the pin
             for i in range(1, 8):
                 end_row = row + d[0] * i
                 end_col = col + d[1] * i
@@ -255,6 +1060,8 @@ class GameState:
         self.get_bishop_moves(row, col, moves)
 
     def get_knight_moves(self, row, col, moves):
+        if (row, col) in self.pins: # a pinned knight can never move
+            return
         directions = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)) # end me if this doesnt work again
         enemy_color = "b" if self.white_to_move else "w"
 
@@ -284,25 +1091,23 @@ class GameState:
                 elif end_pos_piece[0] != ally_color: # can capture piece or empty
                     moves.append(Move((row, col), (end_row, end_col), self.board))
 
+    # the king may not start, pass or land on an attacked square, one attack map answers all of them
     def get_castle_moves(self, row, col, moves):
-        if self.is_square_under_attack(row, col): # cannot castle when king in check
+        if self.white_to_move:
+            king_side, queen_side = self.current_castling_rights.white_king_side, self.current_castling_rights.white_queen_side
+        else:
+            king_side, queen_side = self.current_castling_rights.black_king_side, self.current_castling_rights.black_queen_side
+        king_side = king_side and self.board[row][col + 1] == "--" and self.board[row][col + 2] == "--"
+        queen_side = queen_side and self.board[row][col - 1] == "--" and self.board[row][col - 2] == "--" and self.board[row][col - 3] == "--"
+        if not king_side and not queen_side: # most positions, no map needed
             return
-        
-        if (self.white_to_move and self.current_castling_rights.white_king_side) or (not self.white_to_move and self.current_castling_rights.black_king_side):
-            self.get_kingside_castle_moves(row, col, moves)
-
-        if (self.white_to_move and self.current_castling_rights.white_queen_side) or (not self.white_to_move and self.current_castling_rights.black_queen_side):
-            self.get_queenside_castle_moves(row, col, moves)
-
-    def get_kingside_castle_moves(self, row, col, moves):
-        if self.board[row][col + 1] == "--" and self.board[row][col + 2] == "--":
-            if not self.is_square_under_attack(row, col + 1) and not self.is_square_under_attack(row, col + 2):
-                moves.append(Move((row, col), (row, col + 2), self.board, is_castle_move = True))
-
-    def get_queenside_castle_moves(self, row, col, moves):
-        if self.board[row][col - 1] == "--" and self.board[row][col - 2] == "--" and self.board[row][col - 3] == "--":
-            if not self.is_square_under_attack(row, col - 1) and not self.is_square_under_attack(row, col - 2):
-                moves.append(Move((row, col), (row, col - 2), self.board, is_castle_move = True))
+        attacked = self.get_attack_map()[row]
+        if attacked[col]: # cannot castle when king in check
+            return
+        if king_side and not attacked[col + 1] and not attacked[col + 2]:
+            moves.append(Move((row, col), (row, col + 2), self.board, is_castle_move = True))
+        if queen_side and not attacked[col - 1] and not attacked[col - 2]:
+            moves.append(Move((row, col), (row, col - 2), self.board, is_castle_move = True))
     
     def update_castle_rights(self, move):
         if move.piece_moved == "wK":
@@ -324,6 +1129,20 @@ class GameState:
                 elif move.start_col == 7: # right rook
                     self.current_castling_rights.black_king_side = False
 
+        # a rook captured on its starting square cannot castle anymore
+        if move.piece_captured == "wR":
+            if move.end_row == 7:
+                if move.end_col == 0:
+                    self.current_castling_rights.white_queen_side = False
+                elif move.end_col == 7:
+                    self.current_castling_rights.white_king_side = False
+        elif move.piece_captured == "bR":
+            if move.end_row == 0:
+                if move.end_col == 0:
+                    self.current_castling_rights.black_queen_side = False
+                elif move.end_col == 7:
+                    self.current_castling_rights.black_king_side = False
+
 class CastleRights:
     def __init__(self, white_king_side = True, black_king_side = True, white_queen_side = True, black_queen_side = True):
         self.white_king_side = white_king_side
@@ -341,7 +1160,13 @@ class Move:
 
     cols_to_files = {v: k for k, v in files_to_cols.items()}
 
-    def __init__(self, start_square, end_square, board, is_enpassant_move = False, is_castle_move = False):
+    promotion_ids = {"Q": 0, "R": 1, "B": 2, "N": 3} # queen promotions keep the plain move id so a clicked move matches them
+
+    # fixed attributes instead of a __dict__, moves are created for every node of a search
+    __slots__ = ("start_row", "start_col", "end_row", "end_col", "piece_moved", "piece_captured", "is_pawn_promotion",
+                 "promotion_choice", "is_enpassant", "is_castle_move", "move_id")
+
+    def __init__(self, start_square, end_square, board, is_enpassant_move = False, is_castle_move = False, promotion_choice = "Q"):
         self.start_row = start_square[0]
         self.start_col = start_square[1]
         self.end_row = end_square[0]
@@ -350,6 +1175,7 @@ class Move:
         self.piece_captured = board[self.end_row][self.end_col]
         # pawn promotion
         self.is_pawn_promotion = (self.piece_moved == "wP" and self.end_row == 0) or (self.piece_moved == "bP" and self.end_row == 7)
+        self.promotion_choice = promotion_choice # piece type the pawn turns into
         # enpassant
         self.is_enpassant = is_enpassant_move
         if self.is_enpassant:
@@ -358,6 +1184,8 @@ class Move:
         self.is_castle_move = is_castle_move
 
         self.move_id = self.start_row * 1000 + self.start_col * 100 + self.end_row * 10 + self.end_col
+        if self.is_pawn_promotion:
+            self.move_id += self.promotion_ids[promotion_choice] * 10000
         # print(self.move_id)
 
     # override the = 
@@ -366,8 +1194,115 @@ class Move:
             return self.move_id == other.move_id
         return False
 
+    def __hash__(self):
+        return self.move_id
+
+    # standard algebraic notation, gs is the position before the move is made
+    def get_san(self, gs):
+        if self.is_castle_move:
+            san = "O-O" if self.end_col > self.start_col else "O-O-O"
+        else:
+            piece_type = self.piece_moved[1]
+            san = ""
+            if piece_type == "P":
+                if self.piece_captured != "--":
+                    san = self.cols_to_files[self.start_col]
+            else:
+                san = piece_type
+                # name the file, rank or both if another piece of the same type can reach the same square
+                others = [move for move in gs.get_valid_moves() if move.piece_moved == self.piece_moved and move.end_row == self.end_row and
+                          move.end_col == self.end_col and (move.start_row, move.start_col) != (self.start_row, self.start_col)]
+                if others:
+                    if all(move.start_col != self.start_col for move in others):
+                        san += self.cols_to_files[self.start_col]
+                    elif all(move.start_row != self.start_row for move in others):
+                        san += self.rows_to_ranks[self.start_row]
+                    else:
+                        san += self.get_rank_file(self.start_row, self.start_col)
+            if self.piece_captured != "--":
+                san += "x"
+            san += self.get_rank_file(self.end_row, self.end_col)
+            if self.is_pawn_promotion:
+                san += "=" + self.promotion_choice
+
+        # check or checkmate, the flags of gs are restored after looking at the position
+        checkmate, stalemate, in_check = gs.checkmate, gs.stalemate, gs.in_check
+        gs.make_move(self)
+        if gs.is_king_in_check():
+            san += "#" if len(gs.get_valid_moves()) == 0 else "+"
+        gs.undo_move()
+        gs.checkmate, gs.stalemate, gs.in_check = checkmate, stalemate, in_check
+        return san
+
+    san_pattern = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$")
+
+    # the legal move of gs written as san, raises ValueError if there is none or more than one
+    @classmethod
+    def from_san(cls, gs, san):
+        text = san.rstrip("+#!?").replace("0", "O")
+        valid_moves = gs.get_valid_moves()
+        if text in ("O-O", "O-O-O"):
+            for move in valid_moves:
+                if move.is_castle_move and (move.end_col > move.start_col) == (text == "O-O"):
+                    return move
+            raise ValueError(f"Illegal move {san}")
+
+        match = cls.san_pattern.match(text)
+        if match is None:
+            raise ValueError(f"Invalid move {san}")
+        piece_type, from_file, from_rank, end_square, promotion = match.groups()
+        piece_type = piece_type or "P"
+        end_row, end_col = cls.ranks_to_rows[end_square[1]], cls.files_to_cols[end_square[0]]
+        candidates = []
+        for move in valid_moves:
+            if move.piece_moved[1] != piece_type or move.end_row != end_row or move.end_col != end_col or move.is_castle_move:
+                continue
+            if from_file is not None and move.start_col != cls.files_to_cols[from_file]:
+                continue
+            if from_rank is not None and move.start_row != cls.ranks_to_rows[from_rank]:
+                continue
+            if move.is_pawn_promotion and move.promotion_choice != (promotion or "Q"):
+                continue
+            candidates.append(move)
+        if len(candidates) != 1:
+            raise ValueError(f"{'Ambiguous' if candidates else 'Illegal'} move {san}")
+        return candidates[0]
+
     def get_chess_notation(self):
-        return self.get_rank_file(self.start_row, self.start_col) + self.get_rank_file(self.end_row, self.end_col)
+        notation = self.get_rank_file(self.start_row, self.start_col) + self.get_rank_file(self.end_row, self.end_col)
+        if self.is_pawn_promotion:
+            notation += self.promotion_choice.lower()
+        return notation
 
     def get_rank_file(self, row, col):
-        return self.cols_to_files[col] + self.rows_to_ranks[row]
\ No newline at end of file
+        return self.cols_to_files[col] + self.rows_to_ranks[row]
+
+# legal moves of a position looked up by start square or by start and end square in constant time, for the mouse handler and drawing,
+# len() and iteration work like on the list of moves
+class MoveIndex:
+    def __init__(self, moves):
+        self.moves = moves
+        self.moves_from = {} # (row, col) -> moves of the piece on that square
+        self.moves_between = {} # (start row, start col, end row, end col) -> move, queen promotion for a pawn reaching the last row
+        for move in moves:
+            start = (move.start_row, move.start_col)
+            if start in self.moves_from:
+                self.moves_from[start].append(move)
+            else:
+                self.moves_from[start] = [move]
+            key = (move.start_row, move.start_col, move.end_row, move.end_col)
+            if key not in self.moves_between or move.promotion_choice == "Q":
+                self.moves_between[key] = move
+
+    def __len__(self):
+        return len(self.moves)
+
+    def __iter__(self):
+        return iter(self.moves)
+
+    def get_moves_from(self, square):
+        return self.moves_from.get(square, [])
+
+    # the legal move from the start square to the end square, None if there is none
+    def get_move(self, start_square, end_square):
+        return self.moves_between.get((start_square[0], start_square[1], end_square[0], end_square[1]))
@@ -0,0 +1,66 @@
+# Background engine for the game loop: searches run on a worker thread and their moves come back through a queue that the loop polls,
+# so the window keeps drawing and answering events while the computer thinks
+import queue
+import threading
+from rpg_chess.Controller import search
+
+class EngineWorker:
+    # searcher is a search.Searcher or parallel_search.ParallelSearcher, it is only used from the worker thread
+    def __init__(self, searcher = None):
+        self.searcher = searcher if searcher is not None else search.Searcher(info=None)
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.job = 0 # number of the newest request, results of older ones are stale
+        self.busy = False # a search was requested and its move has not been polled yet
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    # start looking for a move of gs, the worker searches its own copy of the position so gs can be used meanwhile
+    def start_search(self, gs, time_limit):
+        self.submit(gs, time_limit, False)
+        self.busy = True
+
+    # think on the position while the human is to move, nothing is delivered but the table of the searcher fills up with
+    # the positions after the human's possible moves, so the search that follows finds them already searched
+    def start_pondering(self, gs, time_limit = 60.0):
+        self.submit(gs, time_limit, True)
+
+    def submit(self, gs, time_limit, ponder):
+        self.cancel()
+        self.requests.put((self.job, search.get_compact_position(gs), time_limit, ponder))
+
+    # abort whatever the worker is doing, a move it finds later is thrown away, call after undo, reset or a human move
+    def cancel(self):
+        self.job += 1
+        self.busy = False
+        self.searcher.stop_event.set()
+
+    # move notation of the finished search or None, turn it into a move with search.get_move_from_notation
+    def poll(self):
+        while True:
+            try:
+                job, notation = self.results.get_nowait()
+            except queue.Empty:
+                return None
+            if job == self.job: # older results belong to positions that are gone
+                self.busy = False
+                return notation
+
+    def stop(self):
+        self.cancel()
+        self.requests.put(None)
+
+    def run(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            job, position, time_limit, ponder = request
+            # clear the stop before looking at the job number, a cancel in between then either skips this request or stops it
+            self.searcher.stop_event.clear()
+            if job != self.job:
+                continue
+            gs = search.load_compact_position(position)
+            move = self.searcher.find_best_move(gs, time_limit)
+            if not ponder:
+                self.results.put((job, move.get_chess_notation() if move is not None else None))
@@ -0,0 +1,216 @@
+# Compact game history: moves packed into 16 bits, positions into 38 byte snapshots taken every SNAPSHOT_INTERVAL plies,
+# so any ply of a long game is reached by loading one snapshot and replaying fewer than SNAPSHOT_INTERVAL moves,
+# and a binary archive of many games built on the same encoding.
+# archive layout: MAGIC, then per game a GAME_HEADER (result, flags, plies), the starting snapshot if flags & OWN_START,
+# and the packed moves, 2 bytes each, all little endian
+# usage (from the repository root): python -m rpg_chess.Controller.history games.rpga [--game 0] [--ply 40]
+import argparse
+import struct
+import sys
+import time
+from array import array
+from rpg_chess.Controller import bitboard
+from rpg_chess.Controller import chess_engine
+from rpg_chess.Controller import search
+
+SNAPSHOT_INTERVAL = 32
+PIECES = ("--", "wP", "wN", "wB", "wR", "wQ", "wK", "bP", "bN", "bB", "bR", "bQ", "bK")
+PIECE_CODES = {piece: code for code, piece in enumerate(PIECES)}
+PROMOTION_FLAGS = {piece: flag for flag, piece in bitboard.PROMOTION_PIECES.items()}
+# board as 4 bit piece codes, GameState.get_packed_state, white to move, halfmove clock, fullmove number
+SNAPSHOT = struct.Struct("<32sBBHH")
+MAGIC = b"RPGA\x01"
+GAME_HEADER = struct.Struct("<BBI")
+OWN_START = 1 # flag of a game that does not start from the normal position
+RESULTS = ("*", "1-0", "0-1", "1/2-1/2")
+
+# same layout as bitboard.pack_move: start square, end square and a flag for en passant, castling and promotions
+def pack_move(move):
+    if move.is_pawn_promotion:
+        flag = PROMOTION_FLAGS[move.promotion_choice]
+    elif move.is_enpassant:
+        flag = bitboard.ENPASSANT
+    elif move.is_castle_move:
+        flag = bitboard.CASTLE
+    else:
+        flag = bitboard.NORMAL
+    return bitboard.pack_move(move.start_row * 8 + move.start_col, move.end_row * 8 + move.end_col, flag)
+
+# the Move of a packed move in gs, the move is trusted to be legal
+def unpack_move(gs, packed):
+    start, end = bitboard.unpack_move(packed)[:2]
+    flag = packed >> 12
+    coordinates = bitboard.SQUARE_COORDINATES
+    if flag in bitboard.PROMOTION_PIECES:
+        return chess_engine.Move(coordinates[start], coordinates[end], gs.board, promotion_choice = bitboard.PROMOTION_PIECES[flag])
+    return chess_engine.Move(coordinates[start], coordinates[end], gs.board, flag == bitboard.ENPASSANT, flag == bitboard.CASTLE)
+
+def get_snapshot(gs):
+    if gs.class_board is not None:
+        raise ValueError("Snapshots do not store piece classes yet")
+    board = bytearray(32)
+    for square in range(64):
+        board[square >> 1] |= PIECE_CODES[gs.board[square >> 3][square & 7]] << (4 * (square & 1))
+    fullmove_number = gs.start_fullmove_number + (len(gs.move_log) + (0 if gs.start_white_to_move else 1)) // 2
+    return SNAPSHOT.pack(bytes(board), gs.get_packed_state(), gs.white_to_move, min(gs.get_halfmove_clock(), 0xFFFF), fullmove_number)
+
+# GameState of a snapshot, without the moves that led to it
+def load_snapshot(snapshot, backend = "list", move_cache_size = 256):
+    board, state, white_to_move, halfmove_clock, fullmove_number = SNAPSHOT.unpack(snapshot)
+    ranks = []
+    for row in range(8):
+        rank = ""
+        empty = 0
+        for col in range(8):
+            square = row * 8 + col
+            piece = PIECES[(board[square >> 1] >> (4 * (square & 1))) & 15]
+            if piece == "--":
+                empty += 1
+                continue
+            if empty:
+                rank += str(empty)
+                empty = 0
+            rank += piece[1] if piece[0] == "w" else piece[1].lower()
+        ranks.append(rank + (str(empty) if empty else ""))
+    castling = "".join(char for bit, char in ((1, "K"), (2, "Q"), (4, "k"), (8, "q")) if state & bit) or "-"
+    column = state >> 4
+    enpassant = chess_engine.Move.cols_to_files[column - 1] + ("6" if white_to_move else "3") if column else "-"
+    fen = f"{'/'.join(ranks)} {'w' if white_to_move else 'b'} {castling} {enpassant} {halfmove_clock} {fullmove_number}"
+    return chess_engine.GameState(backend, move_cache_size, fen)
+
+class GameRecord:
+    def __init__(self, fen = None, snapshot_interval = SNAPSHOT_INTERVAL):
+        self.fen = fen # starting position, None for the normal one
+        self.moves = array("H") # pack_move of every ply
+        self.result = "*"
+        self.snapshot_interval = snapshot_interval
+        self.snapshots = [] # snapshot after 0, interval, 2 * interval ... plies, taken while seeking
+
+    def __len__(self):
+        return len(self.moves)
+
+    def append(self, move):
+        self.moves.append(pack_move(move))
+
+    # forget the moves after plies, for undo
+    def truncate(self, plies):
+        del self.moves[plies:]
+        del self.snapshots[plies // self.snapshot_interval + 1:]
+
+    # plays moves[start:end] on gs, which must be the position after start plies
+    def replay(self, gs, start = 0, end = None):
+        for packed in self.moves[start:end]:
+            gs.make_move(unpack_move(gs, packed))
+        return gs
+
+    # the whole game up to plies with its full move history, so undo and repetitions work like in the original game
+    def get_game_state(self, plies = None, backend = "list", move_cache_size = 256):
+        return self.replay(chess_engine.GameState(backend, move_cache_size, self.fen), 0, plies)
+
+    # the position after ply plies from the nearest snapshot, without the moves before it, the first seek past the
+    # snapshots so far replays up to the ply once and takes the missing snapshots on the way
+    def seek(self, ply, backend = "list", move_cache_size = 256):
+        if not 0 <= ply <= len(self.moves):
+            raise ValueError(f"Ply {ply} is outside the game of {len(self.moves)} plies")
+        if not self.snapshots:
+            self.snapshots.append(get_snapshot(chess_engine.GameState("list", 0, self.fen)))
+        index = min(ply // self.snapshot_interval, len(self.snapshots) - 1)
+        gs = load_snapshot(self.snapshots[index], backend, move_cache_size)
+        current = index * self.snapshot_interval
+        while current < ply:
+            gs.make_move(unpack_move(gs, self.moves[current]))
+            current += 1
+            if current % self.snapshot_interval == 0 and current // self.snapshot_interval == len(self.snapshots):
+                self.snapshots.append(get_snapshot(gs))
+        return gs
+
+# record of a game given as uci notations, for moves that were not kept as Move objects
+def get_game_record(notations, fen = None, result = "*"):
+    record = GameRecord(fen)
+    record.result = result
+    gs = chess_engine.GameState("list", 0, fen)
+    for notation in notations:
+        move = search.get_move_from_notation(gs, notation)
+        record.append(move)
+        gs.make_move(move)
+    return record
+
+def write_archive_header(file):
+    file.write(MAGIC)
+
+def write_game(file, record):
+    flags = OWN_START if record.fen is not None else 0
+    file.write(GAME_HEADER.pack(RESULTS.index(record.result), flags, len(record.moves)))
+    if flags & OWN_START:
+        file.write(get_snapshot(chess_engine.GameState("list", 0, record.fen)))
+    moves = array("H", record.moves)
+    if sys.byteorder == "big":
+        moves.byteswap()
+    file.write(moves.tobytes())
+
+def write_archive(path, records):
+    games = 0
+    with open(path, "wb") as file:
+        write_archive_header(file)
+        for record in records:
+            write_game(file, record)
+            games += 1
+    return games
+
+# yields the GameRecords of an archive one at a time
+def read_archive(path):
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a game archive")
+        while True:
+            header = file.read(GAME_HEADER.size)
+            if not header:
+                return
+            if len(header) < GAME_HEADER.size:
+                raise ValueError(f"{path}: truncated game header")
+            result, flags, plies = GAME_HEADER.unpack(header)
+            fen = None
+            if flags & OWN_START:
+                fen = load_snapshot(file.read(SNAPSHOT.size), move_cache_size = 0).get_fen()
+            data = file.read(2 * plies)
+            if len(data) < 2 * plies:
+                raise ValueError(f"{path}: truncated moves")
+            record = GameRecord(fen)
+            record.result = RESULTS[result]
+            record.moves.frombytes(data)
+            if sys.byteorder == "big":
+                record.moves.byteswap()
+            yield record
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise a game archive or show one position of it")
+    parser.add_argument("path")
+    parser.add_argument("--game", type=int, help="game to look at, by default every game is counted")
+    parser.add_argument("--ply", type=int, help="ply of the game to show, the end by default")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    games = 0
+    plies = 0
+    results = {}
+    for record in read_archive(args.path):
+        games += 1
+        plies += len(record)
+        results[record.result] = results.get(record.result, 0) + 1
+        if args.game == games - 1:
+            ply = len(record) if args.ply is None else args.ply
+            seek_start = time.perf_counter()
+            try:
+                gs = record.seek(ply)
+            except ValueError as error:
+                sys.exit(str(error))
+            print(f"game {args.game}, {record.result}, {len(record)} plies")
+            print(f"ply {ply}: {gs.get_fen()} ({(time.perf_counter() - seek_start) * 1000:.2f}ms)")
+            return
+    if args.game is not None:
+        sys.exit(f"{args.path} has only {games} games")
+    print(f"{games} games, {plies} plies, " + ", ".join(f"{result} {count}" for result, count in sorted(results.items())) +
+          f", read in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# Parallel search: the root moves are dealt out to a pool of processes, every process searches its share with its own Searcher.
+# Kept apart from search so the engine imports without multiprocessing.
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from rpg_chess.Controller import search
+
+worker_searcher = None # one Searcher per worker process, its table is kept between moves
+worker_stop_event = None
+
+def init_worker(stop_event):
+    global worker_stop_event
+    worker_stop_event = stop_event
+
+def search_root_moves(position, notations, time_limit, max_depth, table_size):
+    global worker_searcher
+    if worker_searcher is None:
+        worker_searcher = search.Searcher(table_size, None)
+        worker_searcher.stop_event = worker_stop_event
+    gs = search.load_compact_position(position)
+    root_moves = [move for move in gs.get_valid_moves() if move.get_chess_notation() in notations]
+    worker_searcher.find_best_move(gs, time_limit, max_depth, root_moves)
+    return [(depth, score, move.get_chess_notation()) for depth, score, move in worker_searcher.iterations], worker_searcher.nodes
+
+class ParallelSearcher:
+    def __init__(self, workers = None, table_size = 1 << 16, info = print):
+        self.workers = workers or os.cpu_count() or 1
+        self.table_size = table_size
+        self.info = info
+        self.stop_event = multiprocessing.Event() # shared with the workers, set to end their searches early
+        # started once, process start up is far too slow to pay every move
+        self.executor = ProcessPoolExecutor(self.workers, initializer=init_worker, initargs=(self.stop_event,))
+        self.orderer = search.Searcher(1, None) # only used to sort the root moves before dealing them out
+        self.book = None # book.OpeningBook, a book move is played without starting the workers
+
+    # same interface as search.Searcher.find_best_move
+    def find_best_move(self, gs, time_limit = 1.0, max_depth = 64):
+        start = time.perf_counter()
+        checkmate, stalemate, in_check = gs.checkmate, gs.stalemate, gs.in_check
+        root_moves = gs.get_valid_moves()
+        gs.checkmate, gs.stalemate, gs.in_check = checkmate, stalemate, in_check
+        self.depth_reached = 0
+        self.score = 0
+        self.nodes = 0
+        if len(root_moves) <= 1:
+            self.elapsed = time.perf_counter() - start
+            return root_moves[0] if root_moves else None
+        book_move = self.book.choose_move(gs, root_moves) if self.book is not None else None
+        if book_move is not None:
+            if self.info is not None:
+                self.info(f"book move {book_move.get_chess_notation()}")
+            self.elapsed = time.perf_counter() - start
+            return book_move
+
+        # every worker searches the most promising move first so it starts with a good alpha bound, without it a worker
+        # holding only weak moves searches them with an open window and does many times the nodes of the whole serial search,
+        # the other moves are dealt out like cards
+        ordered = self.orderer.order_moves(gs, root_moves, 0)
+        rest = ordered[1:]
+        shares = [ordered[:1] + rest[index::self.workers] for index in range(min(self.workers, len(rest)))]
+        position = search.get_compact_position(gs)
+        futures = [self.executor.submit(search_root_moves, position, [move.get_chess_notation() for move in share],
+                                        time_limit, max_depth, self.table_size) for share in shares]
+        results = []
+        for future in futures:
+            iterations, nodes = future.result()
+            results.append(iterations)
+            self.nodes += nodes
+
+        # scores of different depths do not compare, take the deepest depth that every worker finished,
+        # a worker that stopped on a mate score counts as finished at every depth
+        unfinished = [len(iterations) for iterations in results if not iterations or abs(iterations[-1][1]) <= search.MATE_THRESHOLD]
+        depth = min(unfinished) if unfinished else max(len(iterations) for iterations in results)
+        best_move = ordered[0]
+        if depth > 0:
+            best = max((iterations[min(depth, len(iterations)) - 1] for iterations in results), key=lambda iteration: iteration[1])
+            self.depth_reached, self.score = best[0], best[1]
+            best_move = next(move for move in root_moves if move.get_chess_notation() == best[2])
+        self.elapsed = time.perf_counter() - start
+        if self.info is not None:
+            self.info(f"depth {self.depth_reached} score {self.score} nodes {self.nodes} "
+                      f"nps {self.nodes / self.elapsed if self.elapsed > 0 else 0:.0f} time {self.elapsed:.2f} "
+                      f"workers {len(shares)} move {best_move.get_chess_notation()}")
+        return best_move
+
+    def close(self):
+        self.executor.shutdown()
@@ -0,0 +1,162 @@
+# PGN reading and replaying, games are streamed one at a time so archives of any size use constant memory
+# usage (from the repository root): python -m rpg_chess.Controller.pgn games.pgn [--workers 4] [--index games.jsonl]
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from rpg_chess.Controller import chess_engine
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+header_pattern = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+move_number_pattern = re.compile(r"^\d+\.+")
+
+class PGNGame:
+    def __init__(self, offset = 0):
+        self.offset = offset # byte offset of the game in the file, to seek back to it from an index
+        self.headers = {}
+        self.moves = [] # san strings
+        self.result = "*"
+
+# yields PGNGame objects from a file opened in binary mode, comments, variations and NAGs are skipped
+def read_games(file):
+    game = None
+    in_movetext = False
+    comment_depth = 0 # inside { } comments
+    variation_depth = 0 # inside ( ) variations
+    offset = file.tell()
+    for raw_line in file:
+        line_offset = offset
+        offset += len(raw_line)
+        line = raw_line.decode("utf-8", "replace").strip()
+
+        if comment_depth == 0 and variation_depth == 0:
+            if not line or line.startswith("%"):
+                continue
+            match = header_pattern.match(line)
+            if match:
+                if game is not None and in_movetext: # tags after moves start a new game even without a result
+                    yield game
+                    game = None
+                if game is None:
+                    game = PGNGame(line_offset)
+                    in_movetext = False
+                game.headers[match.group(1)] = match.group(2)
+                continue
+
+        if game is None:
+            game = PGNGame(line_offset)
+        in_movetext = True
+        # split braces and parentheses into their own tokens
+        for token in line.replace("{", " { ").replace("}", " } ").replace("(", " ( ").replace(")", " ) ").split():
+            if comment_depth:
+                if token == "}":
+                    comment_depth -= 1
+                continue
+            if token == "{":
+                comment_depth += 1
+            elif token.startswith(";"): # comment until the end of the line
+                break
+            elif token == "(":
+                variation_depth += 1
+            elif token == ")":
+                variation_depth = max(variation_depth - 1, 0)
+            elif variation_depth or token.startswith("$"):
+                continue
+            elif token in RESULTS:
+                game.result = token
+                yield game
+                game = None
+                in_movetext = False
+                break
+            else:
+                token = move_number_pattern.sub("", token)
+                if token:
+                    game.moves.append(token)
+    if game is not None and (game.moves or game.headers):
+        yield game
+
+# plays every move through make_move, raises ValueError at the first illegal one
+def replay_game(game, backend = "list"):
+    gs = chess_engine.GameState(backend, 0, game.headers.get("FEN"))
+    for ply, san in enumerate(game.moves):
+        try:
+            move = chess_engine.Move.from_san(gs, san)
+        except ValueError as error:
+            raise ValueError(f"ply {ply + 1}: {error}")
+        gs.make_move(move)
+    return gs
+
+# index entry of one game, the error is None for a legal game
+def check_game(game):
+    entry = {"offset": game.offset, "white": game.headers.get("White", "?"), "black": game.headers.get("Black", "?"),
+             "result": game.result, "plies": len(game.moves), "error": None}
+    try:
+        gs = replay_game(game)
+        entry["final_fen"] = gs.get_fen()
+        entry["final_key"] = f"{gs.position_key:016x}"
+    except ValueError as error:
+        entry["error"] = str(error)
+    return entry
+
+def check_games(games):
+    return [check_game(game) for game in games]
+
+def get_chunks(games, chunk_size):
+    chunk = []
+    for game in games:
+        chunk.append(game)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# replays every game of the file and yields index entries in file order, with workers > 1 chunks of games go to a process pool,
+# at most 2 chunks per worker are in flight so the archive is never read ahead into memory
+def check_archive(path, workers = 1, chunk_size = 64):
+    with open(path, "rb") as file:
+        chunks = get_chunks(read_games(file), chunk_size)
+        if workers <= 1:
+            for chunk in chunks:
+                yield from check_games(chunk)
+            return
+        with ProcessPoolExecutor(workers) as executor:
+            pending = []
+            for chunk in chunks:
+                pending.append(executor.submit(check_games, chunk))
+                if len(pending) >= workers * 2:
+                    yield from pending.pop(0).result()
+            for future in pending:
+                yield from future.result()
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate and index PGN archives by replaying every game")
+    parser.add_argument("path")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=64, help="games sent to a worker at once")
+    parser.add_argument("--index", help="write one JSON line per game to this file")
+    args = parser.parse_args()
+
+    games = 0
+    illegal = 0
+    start = time.perf_counter()
+    index_file = open(args.index, "w") if args.index else None
+    try:
+        for entry in check_archive(args.path, args.workers, args.chunk_size):
+            games += 1
+            if entry["error"] is not None:
+                illegal += 1
+                print(f"game at byte {entry['offset']} ({entry['white']} - {entry['black']}): {entry['error']}", file=sys.stderr)
+            if index_file is not None:
+                index_file.write(json.dumps(entry) + "\n")
+    finally:
+        if index_file is not None:
+            index_file.close()
+    elapsed = time.perf_counter() - start
+    print(f"{games} games, {illegal} with illegal moves, {elapsed:.1f}s, {games / elapsed if elapsed > 0 else 0:.1f} games/s")
+
+if __name__ == "__main__":
+    main()
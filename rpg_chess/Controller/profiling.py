@@ -0,0 +1,186 @@
+# Engine instrumentation: calls, total and slowest time of the hot GameState functions and Move allocations, exported as
+# JSON or Prometheus text, and cProfile sessions written as pstats plus folded stacks for flame graphs.
+# Nothing is measured until enable() swaps timed wrappers into the classes, disable() puts the original functions back,
+# so with instrumentation off the engine runs exactly the code it always did.
+# usage (from the repository root):
+#   python -m rpg_chess.Controller.profiling [--time 2] [--backend list] [--format json|prometheus] [--profile search.prof] [FEN]
+# flame graph of a profile: flamegraph.pl search.prof.folded > search.svg, or open the .folded file in speedscope
+import argparse
+import contextlib
+import cProfile
+import json
+import os
+import pstats
+import time
+from rpg_chess.Controller import bitboard
+from rpg_chess.Controller import chess_engine
+from rpg_chess.Controller import search
+
+# (class, method) pairs that get counted, the piece generators are called once per piece so a slow piece type shows up
+# on its own, nested calls count in both (get_queen_moves includes its get_rook_moves and get_bishop_moves)
+INSTRUMENTED = [(chess_engine.GameState, name) for name in (
+    "get_valid_moves", "get_valid_moves_list", "get_valid_moves_bitboard", "get_valid_moves_classes", "get_all_possible_moves",
+    "check_for_pins_and_checks", "check_for_pins_and_checks_classes", "is_square_under_attack", "is_legal_after_move",
+    "get_pawn_moves", "get_rook_moves", "get_knight_moves", "get_bishop_moves", "get_queen_moves", "get_king_moves",
+    "get_castle_moves", "get_class_moves", "get_capture_moves", "make_move", "undo_move")] + [
+    (chess_engine.Move, "__init__"), # every Move allocation
+    (bitboard.Bitboards, "get_legal_moves"), (bitboard.Bitboards, "is_square_attacked")]
+
+class Counters:
+    def __init__(self):
+        self.calls = {}
+        self.seconds = {}
+        self.max_seconds = {} # slowest single call, latency spikes hide in the totals
+
+    def reset(self):
+        for name in self.calls:
+            self.calls[name] = 0
+            self.seconds[name] = 0.0
+            self.max_seconds[name] = 0.0
+
+    # name -> {"calls", "seconds", "max_seconds"}, most expensive first, functions never called are left out
+    def to_json(self):
+        names = sorted((name for name in self.calls if self.calls[name]), key=lambda name: -self.seconds[name])
+        return {name: {"calls": self.calls[name], "seconds": round(self.seconds[name], 6),
+                       "max_seconds": round(self.max_seconds[name], 6)} for name in names}
+
+    # Prometheus text exposition format, one series per function
+    def to_prometheus(self, prefix = "rpg_chess_engine"):
+        counters = self.to_json()
+        lines = []
+        for metric, key, kind, text in (("calls_total", "calls", "counter", "Calls of the engine function"),
+                                        ("seconds_total", "seconds", "counter", "Time spent in the engine function, nested calls included"),
+                                        ("max_seconds", "max_seconds", "gauge", "Slowest single call of the engine function")):
+            lines.append(f"# HELP {prefix}_{metric} {text}")
+            lines.append(f"# TYPE {prefix}_{metric} {kind}")
+            for name, values in counters.items():
+                lines.append(f'{prefix}_{metric}{{function="{name}"}} {values[key]}')
+        return "\n".join(lines) + "\n"
+
+counters = Counters()
+originals = {} # (class, method) -> original function while enabled
+
+def make_timed(name, function):
+    calls = counters.calls
+    seconds = counters.seconds
+    max_seconds = counters.max_seconds
+    calls[name] = 0
+    seconds[name] = 0.0
+    max_seconds[name] = 0.0
+    perf_counter = time.perf_counter
+    def timed(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = perf_counter() - start
+            calls[name] += 1
+            seconds[name] += elapsed
+            if elapsed > max_seconds[name]:
+                max_seconds[name] = elapsed
+    # a code object of its own per wrapper, cProfile and pstats key functions by file, line and name, so wrappers sharing
+    # the code of timed would be one function to them and nested instrumented calls would look like recursion
+    timed.__code__ = timed.__code__.replace(co_name=f"timed {name}")
+    timed.__wrapped__ = function
+    return timed
+
+# start counting, GameState.move_functions holds bound methods, so the piece generators are only counted
+# for GameStates created after this call
+def enable():
+    for cls, method in INSTRUMENTED:
+        if (cls, method) not in originals:
+            originals[(cls, method)] = cls.__dict__[method]
+            setattr(cls, method, make_timed(f"{cls.__name__}.{method}", cls.__dict__[method]))
+
+def disable():
+    for (cls, method), function in originals.items():
+        setattr(cls, method, function)
+    originals.clear()
+
+def is_enabled():
+    return bool(originals)
+
+# counters on for the block, the previous state is restored afterwards
+@contextlib.contextmanager
+def instrumented():
+    was_enabled = is_enabled()
+    enable()
+    try:
+        yield counters
+    finally:
+        if not was_enabled:
+            disable()
+
+# folded stacks ("root;caller;function microseconds" per line) from the caller graph of a cProfile run, cProfile only keeps
+# caller -> callee pairs, so the time of a function is split between its callers by the time each of them spent in it,
+# recursion is folded into its outermost frame and the counter wrappers are left out of the stacks
+def get_folded_stacks(stats, max_depth = 64, min_seconds = 1e-6):
+    children = {}
+    for function, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            children.setdefault(caller, []).append((function, edge[3]))
+    stacks = {}
+
+    def walk(function, path, on_path, weight):
+        _, _, own_time, cumulative_time, _ = stats[function]
+        file_name, line, name = function
+        if file_name != __file__ or not name.startswith("timed "):
+            path = path + (f"{name} ({os.path.basename(file_name)}:{line})" if line else name,)
+        fraction = weight / cumulative_time if cumulative_time > 0 else 0.0
+        stack = ";".join(path)
+        stacks[stack] = stacks.get(stack, 0.0) + own_time * fraction
+        if len(path) >= max_depth:
+            return
+        on_path = on_path | {function}
+        for child, edge_time in children.get(function, ()):
+            if child not in on_path and edge_time * fraction >= min_seconds:
+                walk(child, path, on_path, edge_time * fraction)
+
+    for function, (_, _, _, cumulative_time, callers) in stats.items():
+        # called only from frames that were running before the profiler started, or from nothing
+        outside = [edge[3] for caller, edge in callers.items() if caller not in stats]
+        if not callers or outside:
+            walk(function, (), frozenset(), sum(outside) if outside else cumulative_time)
+    return {stack: round(seconds * 1e6) for stack, seconds in stacks.items() if round(seconds * 1e6) > 0}
+
+def write_profile(profiler, path):
+    profiler.dump_stats(path) # pstats, for snakeviz, gprof2dot or python -m pstats
+    stacks = get_folded_stacks(pstats.Stats(profiler).stats)
+    with open(path + ".folded", "w") as file:
+        for stack in sorted(stacks):
+            file.write(f"{stack} {stacks[stack]}\n")
+
+# cProfile around the block, written to path (pstats) and path.folded (flame graph input)
+@contextlib.contextmanager
+def profile(path):
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        write_profile(profiler, path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Count where the engine spends its time during a search")
+    parser.add_argument("fen", nargs="*", help="position, the start position by default")
+    parser.add_argument("--time", type=float, default=2.0, help="seconds to search")
+    parser.add_argument("--backend", default="list", choices=("list", "bitboard", "classes"))
+    parser.add_argument("--format", default="json", choices=("json", "prometheus"))
+    parser.add_argument("--profile", help="also run the search under cProfile and write it here, plus a .folded file")
+    args = parser.parse_args()
+
+    enable()
+    gs = chess_engine.GameState(args.backend, fen=" ".join(args.fen) or None)
+    searcher = search.Searcher(1 << 16, None)
+    with profile(args.profile) if args.profile else contextlib.nullcontext():
+        move = searcher.find_best_move(gs, args.time)
+    disable()
+    if args.format == "json":
+        print(json.dumps({"move": move.get_chess_notation() if move is not None else None, "depth": searcher.depth_reached,
+                          "nodes": searcher.nodes, "counters": counters.to_json()}, indent=2))
+    else:
+        print(counters.to_prometheus(), end="")
+
+if __name__ == "__main__":
+    main()
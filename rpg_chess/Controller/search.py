@@ -0,0 +1,258 @@
+# Computer player: negamax alpha-beta with iterative deepening, quiescence search and move ordering
+import threading
+import time
+from rpg_chess.Controller import chess_engine
+from rpg_chess.Controller import evaluation
+from rpg_chess.Controller import zobrist
+
+PIECE_VALUES = {"P": 100, "N": 320, "B": 330, "R": 500, "Q": 900, "K": 0}
+MATE_SCORE = 100000
+MATE_THRESHOLD = MATE_SCORE - 1000 # scores above this are mates, stored in the table relative to the node
+INFINITY = MATE_SCORE + 1
+MAX_PLY = 128
+TIME_CHECK_NODES = 64 # look at the clock every this many nodes, a few ms at this engine's speed
+DELTA_MARGIN = 200 # a capture that cannot lift the score within this of alpha is not searched in quiescence
+
+class SearchTimeout(Exception):
+    pass
+
+def is_noisy(move):
+    return move.piece_captured != "--" or move.is_pawn_promotion
+
+class Searcher:
+    def __init__(self, table_size = 1 << 16, info = print):
+        self.table = zobrist.TranspositionTable(table_size)
+        self.info = info # called with a line of text after every finished depth, None for silence
+        self.killers = [[None, None] for _ in range(MAX_PLY)] # two quiet moves per ply that caused a cutoff
+        self.history = {} # (piece, end square) -> bonus for quiet moves that caused cutoffs
+        self.nodes = 0
+        self.deadline = None
+        self.stop_event = threading.Event() # set from another thread to end the search early, the last finished depth counts
+        self.evaluate = evaluation.evaluate # incremental material and piece-square tables, swap in any function of gs
+        self.book = None # book.OpeningBook, a book move is played without searching
+
+    # best move of gs found within time_limit seconds, None if there is no legal move
+    # root_moves limits the search to some of the legal moves, then every one of them gets a score even if it is alone
+    def find_best_move(self, gs, time_limit = 1.0, max_depth = 64, root_moves = None):
+        start = time.perf_counter()
+        self.deadline = start + time_limit
+        self.nodes = 0
+        self.table.new_search()
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = {}
+        checkmate, stalemate, in_check = gs.checkmate, gs.stalemate, gs.in_check
+        log_length = len(gs.move_log)
+
+        restricted = root_moves is not None
+        if not restricted:
+            root_moves = gs.get_valid_moves()
+        # until depth 1 finishes the best guess is the first move in search order, captures of big pieces first
+        best_move = self.order_moves(gs, root_moves, 0)[0] if root_moves else None
+        self.root_best_move = None
+        self.depth_reached = 0
+        self.score = 0
+        self.iterations = [] # (depth, score, best move) of every finished depth
+        book_move = self.book.choose_move(gs, root_moves) if self.book is not None and not restricted else None
+        if book_move is not None:
+            if self.info is not None:
+                self.info(f"book move {book_move.get_chess_notation()}")
+            gs.checkmate, gs.stalemate, gs.in_check = checkmate, stalemate, in_check
+            self.elapsed = time.perf_counter() - start
+            return book_move
+        try:
+            for depth in range(1, max_depth + 1):
+                if len(root_moves) == 0 or (len(root_moves) == 1 and not restricted): # nothing to think about
+                    break
+                score, move = self.search_root(gs, root_moves, depth)
+                best_move = move
+                self.depth_reached = depth
+                self.score = score
+                self.iterations.append((depth, score, move))
+                elapsed = time.perf_counter() - start
+                if self.info is not None:
+                    self.info(f"depth {depth} score {score} nodes {self.nodes} nps {self.nodes / elapsed if elapsed > 0 else 0:.0f} "
+                              f"time {elapsed:.2f} move {move.get_chess_notation()}")
+                if abs(score) > MATE_THRESHOLD: # a forced mate was found, deeper search cannot change it
+                    break
+        except SearchTimeout: # undo whatever the unfinished iteration left on the board
+            while len(gs.move_log) > log_length:
+                gs.undo_move()
+            # its best move so far is kept once it has searched the move of the last finished depth, which it tries first,
+            # anything it preferred after that scored better at the deeper depth
+            if self.root_best_move is not None and (not self.iterations or best_move.move_id in self.root_searched):
+                best_move = self.root_best_move
+        gs.checkmate, gs.stalemate, gs.in_check = checkmate, stalemate, in_check
+        self.elapsed = time.perf_counter() - start
+        return best_move
+
+    def search_root(self, gs, moves, depth):
+        alpha, beta = -INFINITY, INFINITY
+        best_move = None
+        self.root_best_move = None # best move of the moves searched so far, for a search stopped in this iteration
+        self.root_searched = set() # move_ids of those moves
+        entry = self.table.probe(gs.position_key) # best move of the previous iteration goes first
+        for move in self.order_moves(gs, moves, 0, entry[3] if entry is not None else None):
+            gs.make_move(move)
+            score = -self.negamax(gs, depth - 1, -beta, -alpha, 1)
+            gs.undo_move()
+            if best_move is None or score > alpha:
+                alpha = score
+                best_move = move
+                self.root_best_move = move
+            self.root_searched.add(move.move_id)
+        self.table.store(gs.position_key, (depth, alpha, zobrist.EXACT, best_move.move_id), depth)
+        return alpha, best_move
+
+    def negamax(self, gs, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes % TIME_CHECK_NODES == 0 and (time.perf_counter() > self.deadline or self.stop_event.is_set()):
+            raise SearchTimeout()
+        if gs.is_repetition(2):
+            return 0
+        if depth <= 0:
+            return self.quiescence(gs, alpha, beta, ply)
+
+        original_alpha = alpha
+        entry = self.table.probe(gs.position_key)
+        table_move_id = None
+        if entry is not None:
+            entry_depth, entry_score, entry_flag, table_move_id = entry
+            if entry_depth >= depth:
+                entry_score = self.score_from_table(entry_score, ply)
+                if entry_flag == zobrist.EXACT:
+                    return entry_score
+                if entry_flag == zobrist.LOWER_BOUND and entry_score >= beta:
+                    return entry_score
+                if entry_flag == zobrist.UPPER_BOUND and entry_score <= alpha:
+                    return entry_score
+
+        moves = gs.get_valid_moves()
+        if len(moves) == 0:
+            return -MATE_SCORE + ply if gs.in_check else 0
+
+        best_score = -INFINITY
+        best_move = None
+        for move in self.order_moves(gs, moves, ply, table_move_id):
+            gs.make_move(move)
+            score = -self.negamax(gs, depth - 1, -beta, -alpha, ply + 1)
+            gs.undo_move()
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if not is_noisy(move): # remember quiet moves that refute the position
+                            killers = self.killers[ply]
+                            if killers[0] != move.move_id:
+                                killers[1] = killers[0]
+                                killers[0] = move.move_id
+                            key = (move.piece_moved, move.end_row * 8 + move.end_col)
+                            self.history[key] = self.history.get(key, 0) + depth * depth
+                        break
+
+        if best_score <= original_alpha:
+            flag = zobrist.UPPER_BOUND
+        elif best_score >= beta:
+            flag = zobrist.LOWER_BOUND
+        else:
+            flag = zobrist.EXACT
+        self.table.store(gs.position_key, (depth, self.score_to_table(best_score, ply), flag, best_move.move_id), depth)
+        return best_score
+
+    # only captures and promotions, so the evaluation is never taken in the middle of an exchange
+    def quiescence(self, gs, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes % TIME_CHECK_NODES == 0 and (time.perf_counter() > self.deadline or self.stop_event.is_set()):
+            raise SearchTimeout()
+        in_check = gs.is_king_in_check()
+        if not in_check: # the side to move may stop capturing, most leaves end here without generating moves
+            stand_pat = self.evaluate(gs)
+            if stand_pat >= beta or ply >= MAX_PLY - 1:
+                return stand_pat
+            if stand_pat > alpha:
+                alpha = stand_pat
+
+        if in_check: # every evasion is searched
+            moves = gs.get_valid_moves()
+            if len(moves) == 0:
+                return -MATE_SCORE + ply
+        else: # only captures and promotions are generated, a stalemate here is scored by the stand pat
+            # delta pruning: a capture that leaves the score below alpha even after winning the piece is not searched
+            margin = alpha - stand_pat - DELTA_MARGIN
+            moves = [move for move in gs.get_capture_moves() if move.is_pawn_promotion or PIECE_VALUES[move.piece_captured[1]] > margin]
+        for move in self.order_moves(gs, moves, ply):
+            gs.make_move(move)
+            score = -self.quiescence(gs, -beta, -alpha, ply + 1)
+            gs.undo_move()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    # table move first, then captures by most valuable victim / least valuable attacker, then killers, then history
+    def order_moves(self, gs, moves, ply, table_move_id = None):
+        killers = self.killers[ply] if ply < MAX_PLY else (None, None)
+        history = self.history
+        scored = []
+        for move in moves:
+            if move.move_id == table_move_id:
+                score = 10000000
+            elif is_noisy(move):
+                score = 1000000 + PIECE_VALUES[move.piece_captured[1]] * 10 - PIECE_VALUES[move.piece_moved[1]] if move.piece_captured != "--" else 1000000
+                if move.is_pawn_promotion:
+                    score += PIECE_VALUES[move.promotion_choice]
+            elif move.move_id == killers[0]:
+                score = 900000
+            elif move.move_id == killers[1]:
+                score = 800000
+            else:
+                score = history.get((move.piece_moved, move.end_row * 8 + move.end_col), 0)
+            scored.append((score, move))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [move for score, move in scored]
+
+    # mate scores are stored as distance from the node, not from the root, so they stay valid in transpositions
+    def score_to_table(self, score, ply):
+        if score > MATE_THRESHOLD:
+            return score + ply
+        if score < -MATE_THRESHOLD:
+            return score - ply
+        return score
+
+    def score_from_table(self, score, ply):
+        if score > MATE_THRESHOLD:
+            return score - ply
+        if score < -MATE_THRESHOLD:
+            return score + ply
+        return score
+
+# compact position for other threads and processes instead of a pickled GameState: (fen, move notations),
+# the moves start from the last capture or pawn move so the rebuilt position has the key history for repetitions
+def get_compact_position(gs):
+    index = len(gs.move_log)
+    while index > 0 and gs.move_log[index - 1].piece_moved[1] != "P" and gs.move_log[index - 1].piece_captured == "--":
+        index -= 1
+    moves = gs.move_log[index:]
+    checkmate, stalemate, in_check = gs.checkmate, gs.stalemate, gs.in_check
+    for _ in moves:
+        gs.undo_move()
+    fen = gs.get_fen()
+    for move in moves:
+        gs.make_move(move)
+    gs.checkmate, gs.stalemate, gs.in_check = checkmate, stalemate, in_check
+    return fen, [move.get_chess_notation() for move in moves]
+
+def get_move_from_notation(gs, notation):
+    for move in gs.get_valid_moves():
+        if move.get_chess_notation() == notation:
+            return move
+    raise ValueError(f"illegal move {notation}")
+
+def load_compact_position(position, backend = "list"):
+    fen, notations = position
+    gs = chess_engine.GameState(backend, fen=fen)
+    for notation in notations:
+        gs.make_move(get_move_from_notation(gs, notation))
+    return gs
@@ -0,0 +1,204 @@
+# Headless self-play: plays many games between configurable players over a process pool, without pygame,
+# and streams one JSON line per game (result, length, time per move) to a file for statistics
+# usage (from the repository root):
+#   python -m rpg_chess.Controller.self_play --games 1000 --white depth:2 --black random --output games.jsonl
+#   python -m rpg_chess.Controller.self_play --games 1000 --archive games.rpga   moves of every game in the binary archive format
+# players: random, depth:N (search N plies deep), time:S (search S seconds per move)
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from rpg_chess.Controller import chess_engine
+from rpg_chess.Controller import history
+from rpg_chess.Controller import search
+
+class RandomPlayer:
+    def __init__(self, rng):
+        self.rng = rng
+
+    def choose_move(self, gs, moves):
+        return self.rng.choice(moves)
+
+class SearchPlayer:
+    def __init__(self, time_limit, max_depth):
+        self.searcher = search.Searcher(1 << 14, None)
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+
+    def choose_move(self, gs, moves):
+        return self.searcher.find_best_move(gs, self.time_limit, self.max_depth)
+
+# a player from its command line name, raises ValueError for an unknown one
+def make_player(spec, rng):
+    name, _, argument = spec.partition(":")
+    if name == "random":
+        return RandomPlayer(rng)
+    if name == "depth" and argument.isdigit():
+        return SearchPlayer(3600.0, int(argument))
+    if name == "time":
+        return SearchPlayer(float(argument), search.MAX_PLY)
+    raise ValueError(f"Unknown player {spec}")
+
+# only kings, or kings and a single knight or bishop: nobody can mate any more
+def is_insufficient_material(board):
+    others = [piece for row in board for piece in row if piece != "--" and piece[1] != "K"]
+    return len(others) == 0 or (len(others) == 1 and others[0][1] in "NB")
+
+# (result, reason) if the game is over, None while it goes on
+def get_game_over(gs, moves):
+    if len(moves) == 0:
+        if gs.in_check:
+            return ("0-1" if gs.white_to_move else "1-0"), "checkmate"
+        return "1/2-1/2", "stalemate"
+    if gs.is_threefold_repetition():
+        return "1/2-1/2", "repetition"
+    if gs.get_halfmove_clock() >= 100:
+        return "1/2-1/2", "fifty moves"
+    if is_insufficient_material(gs.board):
+        return "1/2-1/2", "material"
+    return None
+
+# plays one game, the first random_plies half moves are random for both sides so games between the same players differ
+def play_game(index, white, black, seed, fen = None, random_plies = 0, max_plies = 400, record_moves = False):
+    rng = random.Random(seed)
+    gs = chess_engine.GameState(fen=fen)
+    players = (make_player(white, rng), make_player(black, rng))
+    opening = RandomPlayer(rng)
+    think_times = ([], []) # seconds per move of white and black
+    notations = []
+    start = time.perf_counter()
+    while True:
+        moves = gs.get_valid_moves()
+        game_over = get_game_over(gs, moves)
+        if game_over is not None:
+            result, reason = game_over
+            break
+        if len(gs.move_log) >= max_plies:
+            result, reason = "*", "ply limit"
+            break
+        side = 0 if gs.white_to_move else 1
+        if len(gs.move_log) < random_plies:
+            move = opening.choose_move(gs, moves)
+        else:
+            move_start = time.perf_counter()
+            move = players[side].choose_move(gs, moves)
+            think_times[side].append(time.perf_counter() - move_start)
+        notations.append(move.get_chess_notation())
+        gs.make_move(move)
+    record = {"game": index, "white": white, "black": black, "result": result, "reason": reason, "plies": len(gs.move_log),
+              "seconds": round(time.perf_counter() - start, 3),
+              "white_ms": round(1000 * sum(think_times[0]) / len(think_times[0]), 2) if think_times[0] else 0.0,
+              "black_ms": round(1000 * sum(think_times[1]) / len(think_times[1]), 2) if think_times[1] else 0.0}
+    if record_moves:
+        record["moves"] = " ".join(notations)
+    return record
+
+def play_games(games):
+    return [play_game(*game) for game in games]
+
+# argument tuples of play_game, with alternate the players change colors every game
+def get_games(count, white, black, seed, fen, random_plies, max_plies, record_moves, alternate):
+    for index in range(count):
+        if alternate and index % 2 == 1:
+            yield (index, black, white, seed + index, fen, random_plies, max_plies, record_moves)
+        else:
+            yield (index, white, black, seed + index, fen, random_plies, max_plies, record_moves)
+
+def get_chunks(games, chunk_size):
+    chunk = []
+    for game in games:
+        chunk.append(game)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# yields game records in game order, at most 2 chunks per worker are in flight so results stream out while games are played
+def run_games(games, workers = 1, chunk_size = 4):
+    chunks = get_chunks(games, chunk_size)
+    if workers <= 1:
+        for chunk in chunks:
+            yield from play_games(chunk)
+        return
+    with ProcessPoolExecutor(workers) as executor:
+        pending = []
+        for chunk in chunks:
+            pending.append(executor.submit(play_games, chunk))
+            if len(pending) >= workers * 2:
+                yield from pending.pop(0).result()
+        for future in pending:
+            yield from future.result()
+
+def main():
+    parser = argparse.ArgumentParser(description="Play games between engine players without a window")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--white", default="depth:2", help="random, depth:N or time:SECONDS")
+    parser.add_argument("--black", default="random")
+    parser.add_argument("--alternate", action="store_true", help="swap colors every other game")
+    parser.add_argument("--fen", help="starting position, default the normal one")
+    parser.add_argument("--random-plies", type=int, default=2, help="random half moves at the start of every game")
+    parser.add_argument("--max-plies", type=int, default=400, help="games longer than this end unfinished")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=4, help="games sent to a worker at once")
+    parser.add_argument("--output", help="write one JSON line per game to this file")
+    parser.add_argument("--moves", action="store_true", help="include the moves of every game in the output")
+    parser.add_argument("--archive", help="write the games to this file in the binary format of rpg_chess.Controller.history")
+    args = parser.parse_args()
+    for spec in (args.white, args.black):
+        try:
+            make_player(spec, None)
+        except ValueError as error:
+            parser.error(str(error))
+
+    scores = {} # player -> [wins, draws, losses]
+    unfinished = 0
+    plies = 0
+    start = time.perf_counter()
+    output = open(args.output, "w") if args.output else None
+    archive = open(args.archive, "wb") if args.archive else None
+    try:
+        if archive is not None:
+            history.write_archive_header(archive)
+        games = get_games(args.games, args.white, args.black, args.seed, args.fen, args.random_plies, args.max_plies,
+                          args.moves or archive is not None, args.alternate)
+        for record in run_games(games, args.workers, args.chunk_size):
+            if archive is not None:
+                notations = record["moves"].split() if args.moves else record.pop("moves").split()
+                history.write_game(archive, history.get_game_record(notations, args.fen, record["result"]))
+            if output is not None:
+                output.write(json.dumps(record, separators=(",", ":")) + "\n")
+            plies += record["plies"]
+            if args.white == args.black: # the same player on both sides, count the colors instead
+                white_score, black_score = scores.setdefault("white", [0, 0, 0]), scores.setdefault("black", [0, 0, 0])
+            else:
+                white_score, black_score = scores.setdefault(record["white"], [0, 0, 0]), scores.setdefault(record["black"], [0, 0, 0])
+            if record["result"] == "1-0":
+                white_score[0] += 1
+                black_score[2] += 1
+            elif record["result"] == "0-1":
+                white_score[2] += 1
+                black_score[0] += 1
+            elif record["result"] == "1/2-1/2":
+                white_score[1] += 1
+                black_score[1] += 1
+            else:
+                unfinished += 1
+            if (record["game"] + 1) % 10 == 0:
+                print(f"{record['game'] + 1} games", file=sys.stderr)
+    finally:
+        if output is not None:
+            output.close()
+        if archive is not None:
+            archive.close()
+    elapsed = time.perf_counter() - start
+    for player, (wins, draws, losses) in scores.items():
+        print(f"{player:12} +{wins} ={draws} -{losses}")
+    print(f"{args.games} games, {unfinished} unfinished, {plies} plies, {elapsed:.1f}s, {args.games / elapsed if elapsed > 0 else 0:.2f} games/s")
+
+if __name__ == "__main__":
+    main()
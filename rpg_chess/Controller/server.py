@@ -0,0 +1,238 @@
+# Game server: many GameState sessions in one asyncio process, one JSON object per line in both directions
+# usage (from the repository root): python -m rpg_chess.Controller.server [--port 8765] [--idle-timeout 60] [--workers 2] [--book book.bin]
+# requests, "id" is optional and copied into the answer:
+#   {"op": "new", "fen": optional}                    -> {"ok": true, "game": game id, ...state}
+#   {"op": "move", "game": id, "move": "e2e4"}        uci notation or san
+#   {"op": "undo", "game": id}
+#   {"op": "moves", "game": id}                       -> {"ok": true, "moves": ["e2e4", ...]}
+#   {"op": "state", "game": id}                       -> {"ok": true, "fen": ..., "status": ..., "plies": ...}
+#   {"op": "search", "game": id, "time": 0.5, "play": false}  engine move, searched in a worker process
+#   {"op": "close", "game": id}
+#   {"op": "stats", "format": "json"}               -> server counters, engine counters with --instrument, "prometheus" as text
+# errors answer {"ok": false, "error": "..."}
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from rpg_chess.Controller import book
+from rpg_chess.Controller import chess_engine
+from rpg_chess.Controller import history
+from rpg_chess.Controller import profiling
+from rpg_chess.Controller import search
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+MOVE_CACHE_SIZE = 16 # per session, thousands of sessions share the memory
+
+class Session:
+    def __init__(self, fen):
+        self.record = history.GameRecord(fen) # starting position and packed moves, all that is kept of an evicted game
+        self.gs = chess_engine.GameState("list", MOVE_CACHE_SIZE, fen)
+        self.last_used = time.monotonic()
+        self.version = 0 # counts every move and undo, an undo followed by a move leaves the ply count unchanged
+
+    # the GameState, rebuilt by replaying the moves if the session was evicted
+    def get_game_state(self):
+        self.last_used = time.monotonic()
+        if self.gs is None:
+            self.gs = self.record.get_game_state(move_cache_size = MOVE_CACHE_SIZE)
+        return self.gs
+
+    def evict(self):
+        self.gs = None
+
+def get_status(gs):
+    moves = gs.get_valid_moves()
+    if len(moves) == 0:
+        return "checkmate" if gs.in_check else "stalemate"
+    if gs.is_threefold_repetition():
+        return "repetition"
+    if gs.get_halfmove_clock() >= 100:
+        return "fifty moves"
+    return "check" if gs.in_check else "playing"
+
+def get_state(gs):
+    return {"fen": gs.get_fen(), "white_to_move": gs.white_to_move, "status": get_status(gs), "plies": len(gs.move_log)}
+
+worker_searcher = None # one Searcher per executor process
+
+# the book is mapped once per process, all of them read the same pages of the file
+def search_position(position, time_limit, book_path = None):
+    global worker_searcher
+    if worker_searcher is None:
+        worker_searcher = search.Searcher(1 << 16, None)
+        if book_path is not None:
+            worker_searcher.book = book.OpeningBook(book_path)
+    gs = search.load_compact_position(position)
+    move = worker_searcher.find_best_move(gs, time_limit)
+    return move.get_chess_notation() if move is not None else None, worker_searcher.depth_reached, worker_searcher.score
+
+class GameServer:
+    def __init__(self, idle_timeout = 60.0, workers = None, max_search_time = 5.0, book_path = None):
+        self.sessions = {}
+        self.game_ids = itertools.count(1)
+        self.idle_timeout = idle_timeout # seconds without requests before a session is shrunk to its moves
+        self.max_search_time = max_search_time
+        self.book_path = book_path # opening book the engine plays from, None for none
+        self.executor = ProcessPoolExecutor(workers or os.cpu_count() or 1) # searches hold the GIL, threads would stall the loop
+        self.requests = 0
+        self.evictions = 0
+        self.operations = {"new": self.new_game, "move": self.make_move, "undo": self.undo_move, "moves": self.get_moves,
+                           "state": self.get_game_state, "search": self.search, "close": self.close_game, "stats": self.get_stats}
+
+    def get_session(self, request):
+        session = self.sessions.get(request.get("game"))
+        if session is None:
+            raise ValueError(f"Unknown game {request.get('game')}")
+        return session
+
+    async def new_game(self, request):
+        session = Session(request.get("fen") or START_FEN)
+        game_id = next(self.game_ids)
+        self.sessions[game_id] = session
+        return {"game": game_id, **get_state(session.gs)}
+
+    async def make_move(self, request):
+        session = self.get_session(request)
+        gs = session.get_game_state()
+        text = request.get("move", "")
+        move = None
+        for valid_move in gs.get_valid_moves():
+            if valid_move.get_chess_notation() == text:
+                move = valid_move
+                break
+        if move is None:
+            move = chess_engine.Move.from_san(gs, text) # raises ValueError for anything illegal
+        gs.make_move(move)
+        session.record.append(move)
+        session.version += 1
+        return get_state(gs)
+
+    async def undo_move(self, request):
+        session = self.get_session(request)
+        gs = session.get_game_state()
+        if not session.record:
+            raise ValueError("No move to undo")
+        gs.undo_move()
+        session.record.truncate(len(session.record) - 1)
+        session.version += 1
+        return get_state(gs)
+
+    async def get_moves(self, request):
+        gs = self.get_session(request).get_game_state()
+        return {"moves": [move.get_chess_notation() for move in gs.get_valid_moves()]}
+
+    async def get_game_state(self, request):
+        return get_state(self.get_session(request).get_game_state())
+
+    async def search(self, request):
+        session = self.get_session(request)
+        gs = session.get_game_state()
+        time_limit = min(float(request.get("time", 0.5)), self.max_search_time)
+        version = session.version
+        notation, depth, score = await asyncio.get_running_loop().run_in_executor(
+            self.executor, search_position, search.get_compact_position(gs), time_limit, self.book_path)
+        answer = {"move": notation, "depth": depth, "score": score}
+        if request.get("play") and notation is not None:
+            if session.version != version: # the game went on or was taken back while the engine was thinking
+                raise ValueError("Position changed during the search")
+            answer.update(await self.make_move({"game": request["game"], "move": notation}))
+        return answer
+
+    async def close_game(self, request):
+        self.get_session(request)
+        del self.sessions[request["game"]]
+        return {}
+
+    # engine counters only cover this process, searches in the executor are not counted
+    async def get_stats(self, request):
+        stats = {"sessions": len(self.sessions), "requests": self.requests, "evictions": self.evictions}
+        if request.get("format") == "prometheus":
+            lines = [f"rpg_chess_server_{name} {value}" for name, value in stats.items()]
+            return {"text": "\n".join(lines) + "\n" + profiling.counters.to_prometheus()}
+        return {**stats, "engine": profiling.counters.to_json()}
+
+    async def handle_request(self, line):
+        self.requests += 1
+        request = {}
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                request = {}
+                raise ValueError("Request must be a JSON object")
+            operation = self.operations.get(request.get("op"))
+            if operation is None:
+                raise ValueError(f"Unknown op {request.get('op')}")
+            answer = {"ok": True, **await operation(request)}
+        except Exception as error: # a bad request must never take the connection or the server down
+            answer = {"ok": False, "error": str(error) or type(error).__name__}
+        if "id" in request:
+            answer["id"] = request["id"]
+        return answer
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                answer = await self.handle_request(line)
+                writer.write(json.dumps(answer, separators=(",", ":")).encode() + b"\n")
+                await writer.drain()
+        # dropped connection, a line over the stream limit, or the server shutting down with the client still connected
+        # (a handler task that ends cancelled makes asyncio log a traceback)
+        except (ConnectionError, ValueError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    # shrinks sessions nobody asked about for idle_timeout seconds to their starting FEN and move list
+    async def evict_idle_sessions(self):
+        while True:
+            await asyncio.sleep(max(self.idle_timeout / 4, 0.1))
+            now = time.monotonic()
+            for session in self.sessions.values():
+                if session.gs is not None and now - session.last_used > self.idle_timeout:
+                    session.evict()
+                    self.evictions += 1
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_client, host, port, limit=1 << 16)
+        evictor = asyncio.create_task(self.evict_idle_sessions())
+        print(f"serving on {', '.join(str(sock.getsockname()) for sock in server.sockets)}", flush=True)
+        # SIGTERM (terminate(), kill, service managers) stops serving like Ctrl+C, so the finally below shuts the workers down
+        stop = asyncio.Event()
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+        except NotImplementedError: # no loop signal handlers on Windows
+            pass
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            evictor.cancel()
+            self.executor.shutdown(cancel_futures=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Host many chess games over a JSON line protocol")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--idle-timeout", type=float, default=60.0, help="seconds before an unused game is shrunk to its moves")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes for engine searches")
+    parser.add_argument("--book", help="opening book for the engine, see rpg_chess.Controller.book")
+    parser.add_argument("--instrument", action="store_true", help="count engine calls for the stats op, costs some speed")
+    args = parser.parse_args()
+    if args.instrument:
+        profiling.enable()
+    if args.book is not None:
+        book.OpeningBook(args.book).close() # fail at start up, not in the first search
+    try:
+        asyncio.run(GameServer(args.idle_timeout, args.workers, book_path=args.book).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
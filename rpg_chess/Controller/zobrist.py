@@ -0,0 +1,93 @@
+# Zobrist keys: a position is the xor of one random 64 bit number per (piece, square), side to move, castling rights and en passant file
+import random
+
+generator = random.Random(20240607) # fixed seed so keys are the same in every process and run
+
+PIECE_KEYS = {color + piece: [generator.getrandbits(64) for _ in range(64)] for color in "wb" for piece in "PRNBQK"}
+BLACK_TO_MOVE_KEY = generator.getrandbits(64)
+ENPASSANT_KEYS = [generator.getrandbits(64) for _ in range(8)] # one per column
+CASTLE_RIGHT_KEYS = [generator.getrandbits(64) for _ in range(4)] # white king side, white queen side, black king side, black queen side
+# every combination of castling rights, indexed by get_castle_rights_index
+CASTLE_KEYS = [0] * 16
+for index in range(16):
+    for right in range(4):
+        if index & (1 << right):
+            CASTLE_KEYS[index] ^= CASTLE_RIGHT_KEYS[right]
+
+def get_castle_rights_index(castle_rights):
+    return (castle_rights.white_king_side | (castle_rights.white_queen_side << 1) |
+            (castle_rights.black_king_side << 2) | (castle_rights.black_queen_side << 3))
+
+# en passant only changes the position if a pawn of the side to move can actually capture, otherwise transpositions would get different keys
+def get_enpassant_key(board, enpassant_possible, white_to_move):
+    if enpassant_possible == ():
+        return 0
+    row, col = enpassant_possible
+    pawn_row, pawn = (row + 1, "wP") if white_to_move else (row - 1, "bP")
+    if (col - 1 >= 0 and board[pawn_row][col - 1] == pawn) or (col + 1 <= 7 and board[pawn_row][col + 1] == pawn):
+        return ENPASSANT_KEYS[col]
+    return 0
+
+# full recomputation, used when a GameState is created and to cross check the incremental key
+def compute_key(gs):
+    key = 0
+    for row in range(8):
+        for col in range(8):
+            piece = gs.board[row][col]
+            if piece != "--":
+                key ^= PIECE_KEYS[piece][row * 8 + col]
+    if not gs.white_to_move:
+        key ^= BLACK_TO_MOVE_KEY
+    key ^= CASTLE_KEYS[get_castle_rights_index(gs.current_castling_rights)]
+    key ^= get_enpassant_key(gs.board, gs.enpassant_possible, gs.white_to_move)
+    if gs.class_board is not None: # RPG classes of the pieces
+        for row in range(8):
+            for col in range(8):
+                if gs.class_board[row][col] is not None:
+                    key ^= gs.class_board[row][col].keys[row * 8 + col]
+    return key
+
+# bounds stored with search results
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+
+class TranspositionTable:
+    # fixed number of slots indexed by the low bits of the key, each slot keeps the full key so a different position is never returned
+    def __init__(self, size = 1 << 16):
+        self.size = 1 << (max(size, 1).bit_length() - 1) # round down to a power of two
+        self.mask = self.size - 1
+        self.keys = [0] * self.size
+        self.depths = [-1] * self.size
+        self.generations = [0] * self.size
+        self.values = [None] * self.size
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def probe(self, key):
+        index = key & self.mask
+        if self.keys[index] == key and self.values[index] is not None:
+            self.hits += 1
+            return self.values[index]
+        self.misses += 1
+        return None
+
+    # replace the slot if it is empty, holds the same position, comes from an older search or was searched less deep
+    def store(self, key, value, depth = 0):
+        index = key & self.mask
+        if self.values[index] is None or self.keys[index] == key or self.generations[index] != self.generation or depth >= self.depths[index]:
+            self.keys[index] = key
+            self.depths[index] = depth
+            self.generations[index] = self.generation
+            self.values[index] = value
+
+    # entries of previous searches stay usable but lose their protection against replacement
+    def new_search(self):
+        self.generation += 1
+
+    def clear(self):
+        for index in range(self.size):
+            self.keys[index] = 0
+            self.depths[index] = -1
+            self.values[index] = None
+        self.hits = 0
+        self.misses = 0
@@ -1,6 +1,11 @@
-import pygame
+# plain python values only, so the engine and headless tools can import this without pygame
 #Game Constants
 FPS = 20
+IDLE_WAIT = 1000 # milliseconds the idle game loop sleeps waiting for input before it looks around again
+AI_TIME_LIMIT = 1.0 # seconds the computer player may think per move
+AI_WORKERS = 1 # processes for the computer player, more than 1 splits the search over several cores
+AI_PONDER = True # the computer keeps thinking while the human is to move
+AI_BOOK = True # the computer plays from the opening book if one was built
 PIECE_NAMES = ("wP", "wR", "wN", "wB", "wK", "wQ", "bP", "bR", "bN", "bB", "bK", "bQ")
 
 # Board Constants
@@ -8,10 +13,10 @@ DIMENSION = 8
 WIDTH, HEIGHT = 1150, 700
 SQUARE_SIZE = 88 # Magic number !DO NOT CHANGE!, a lot of bugs using border, width and hight // dimention led me to this deredje
 
-# Color Constants
-WHITE = pygame.Color("white")
-BLACK = pygame.Color("black")
-BROWN = pygame.Color("#8B4513")
-GRAY = pygame.Color("#D3D3D3")
-BLUE = pygame.Color(152, 245, 255)
-GREEN = pygame.Color("green")
\ No newline at end of file
+# Color Constants, anything pygame.Color accepts, the view turns them into colors
+WHITE = "white"
+BLACK = "black"
+BROWN = "#8B4513"
+GRAY = "#D3D3D3"
+BLUE = (152, 245, 255)
+GREEN = "green"
\ No newline at end of file
@@ -0,0 +1,101 @@
+# RPG piece classes: a class changes how a piece moves (extra jumps, more slide directions, shorter range) and carries
+# its stats (hp, cooldown, abilities). Classes are read from piece_classes.json and compiled into per square tables once,
+# move generation then only walks the tables and never looks at the rules again.
+import json
+import math
+import os
+import random
+
+CLASSES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "piece_classes.json")
+
+ROOK_DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1))
+BISHOP_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+KNIGHT_JUMPS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+KING_JUMPS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+
+# movement of the plain chess pieces, pawns move by their own rules and have no table
+BASE_MOVEMENT = {
+    "N": {"leaps": KNIGHT_JUMPS, "slides": ()},
+    "B": {"leaps": (), "slides": BISHOP_DIRECTIONS},
+    "R": {"leaps": (), "slides": ROOK_DIRECTIONS},
+    "Q": {"leaps": (), "slides": ROOK_DIRECTIONS + BISHOP_DIRECTIONS},
+    "K": {"leaps": KING_JUMPS, "slides": ()},
+    "P": {"leaps": (), "slides": ()},
+}
+CLASS_PIECE_TYPES = ("N", "B", "R", "Q") # pieces that can take a class, pawns and kings keep their special rules
+
+class PieceClass:
+    def __init__(self, name, piece_type, leaps = (), slides = (), slide_range = 7, hp = 1, cooldown = 0, abilities = ()):
+        self.name = name
+        self.piece_type = piece_type
+        self.leaps = frozenset(tuple(leap) for leap in leaps) # (row, col) offsets of single jumps
+        self.slide_range = slide_range # squares a slider may travel at most
+        self.slides = tuple(dict.fromkeys(tuple(direction) for direction in slides)) # sliding directions without duplicates
+        self.hp = hp
+        self.cooldown = cooldown # turns between two uses of an ability
+        self.abilities = tuple(abilities)
+        self.compile()
+
+    # per square tables: jump targets, the squares of every slide ray in order, and the slide range seen from an attacked
+    # square (looking in direction d from the target finds attackers sliding in direction -d)
+    # a jump that lands on a ray square is not a jump target, the ray already reaches it unless a piece stands on the ray
+    # before it, those jumps are kept in covered_leaps with the ray squares in front of them
+    def compile(self):
+        self.leap_targets = []
+        self.covered_leaps = []
+        self.rays = []
+        for square in range(64):
+            row, col = divmod(square, 8)
+            rays = []
+            for dr, dc in self.slides:
+                ray = tuple((row + dr * i, col + dc * i) for i in range(1, self.slide_range + 1)
+                            if 0 <= row + dr * i <= 7 and 0 <= col + dc * i <= 7)
+                if ray:
+                    rays.append(ray)
+            self.rays.append(tuple(rays))
+            in_front = {target: ray[:i] for ray in rays for i, target in enumerate(ray)} # ray square -> squares before it
+            targets = [(row + dr, col + dc) for dr, dc in sorted(self.leaps) if 0 <= row + dr <= 7 and 0 <= col + dc <= 7]
+            self.leap_targets.append(tuple(target for target in targets if target not in in_front))
+            self.covered_leaps.append(tuple((target, in_front[target]) for target in targets if in_front.get(target)))
+        self.attack_ranges = {(-dr, -dc): self.slide_range for dr, dc in self.slides}
+        # zobrist keys of the class on every square, the plain pieces are already in the piece keys and add nothing
+        if self.name in STANDARD_NAMES:
+            self.keys = [0] * 64
+        else:
+            generator = random.Random(f"{self.name}/{self.piece_type}") # same keys in every process
+            self.keys = [generator.getrandbits(64) for _ in range(64)]
+
+STANDARD_NAMES = {"pawn": "P", "knight": "N", "bishop": "B", "rook": "R", "queen": "Q", "king": "K"}
+# piece type -> the class every piece starts with
+STANDARD_CLASSES = {piece_type: PieceClass(name, piece_type, BASE_MOVEMENT[piece_type]["leaps"], BASE_MOVEMENT[piece_type]["slides"])
+                    for name, piece_type in STANDARD_NAMES.items()}
+
+# builds a class from its data: the base piece's movement plus "leaps" and "slides", "range" limits every slide
+def make_piece_class(name, data):
+    piece_type = data.get("piece")
+    if piece_type not in CLASS_PIECE_TYPES:
+        raise ValueError(f"Class {name}: piece must be one of {', '.join(CLASS_PIECE_TYPES)}")
+    if name in STANDARD_NAMES:
+        raise ValueError(f"Class {name}: the name is taken by a plain piece")
+    leaps = list(BASE_MOVEMENT[piece_type]["leaps"]) + [tuple(leap) for leap in data.get("leaps", [])]
+    slides = list(BASE_MOVEMENT[piece_type]["slides"]) + [tuple(direction) for direction in data.get("slides", [])]
+    for offset in leaps + slides:
+        if len(offset) != 2 or offset == (0, 0) or max(abs(offset[0]), abs(offset[1])) > 7:
+            raise ValueError(f"Class {name}: invalid offset {list(offset)}")
+    # slides may take steps of any size ([2, 1] is a nightrider), but two of them going the same way would share squares
+    directions = {}
+    for dr, dc in slides:
+        step = math.gcd(dr, dc)
+        first = directions.setdefault((dr // step, dc // step), (dr, dc))
+        if first != (dr, dc):
+            raise ValueError(f"Class {name}: slides {list(first)} and {[dr, dc]} go the same way")
+    slide_range = data.get("range", 7)
+    if not 1 <= slide_range <= 7:
+        raise ValueError(f"Class {name}: range must be between 1 and 7")
+    return PieceClass(name, piece_type, leaps, slides, slide_range, data.get("hp", 1), data.get("cooldown", 0), data.get("abilities", []))
+
+# name -> compiled PieceClass of every class in the file
+def load_piece_classes(path = CLASSES_PATH):
+    with open(path) as file:
+        data = json.load(file)
+    return {name: make_piece_class(name, class_data) for name, class_data in data.items()}
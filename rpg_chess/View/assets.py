@@ -0,0 +1,88 @@
+# Sprite atlas: every PNG of images/ (the pieces and any per class variants) is scaled to SQUARE_SIZE once and packed into pages
+# of PAGE_SIZE x PAGE_SIZE sprites that are cached on disk, later starts read the cache instead of loading and scaling every file.
+# A page is only loaded when one of its sprites is drawn for the first time, so memory follows the sprites in use,
+# not the number of sprites that exist.
+import json
+import os
+import pygame
+from rpg_chess.Data.constants import PIECE_NAMES, SQUARE_SIZE
+
+IMAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "images")
+CACHE_DIR = os.path.join(IMAGES_DIR, ".cache")
+PAGE_SIZE = 8 # sprites per page row and column
+SPRITES_PER_PAGE = PAGE_SIZE * PAGE_SIZE
+CACHE_VERSION = 2 # bump when the cache layout changes
+
+class SpriteAtlas:
+    def __init__(self, sprite_size = SQUARE_SIZE, images_dir = IMAGES_DIR, cache_dir = CACHE_DIR):
+        self.sprite_size = sprite_size
+        self.images_dir = images_dir
+        self.cache_dir = cache_dir
+        # the twelve standard pieces take ids 0-11 so they always share the first page, the variants follow sorted by name
+        file_names = set(file_name for file_name in os.listdir(images_dir) if file_name.endswith(".png"))
+        sources = [name + ".png" for name in PIECE_NAMES if name + ".png" in file_names]
+        sources += sorted(file_names.difference(sources))
+        self.names = [file_name[:-4] for file_name in sources]
+        self.ids = {name: sprite_id for sprite_id, name in enumerate(self.names)} # name -> sprite id
+        self.sprites = [None] * len(self.names) # sprite id -> surface, filled on first use
+        self.pages = [None] * ((len(self.names) + SPRITES_PER_PAGE - 1) // SPRITES_PER_PAGE)
+        # the cache belongs to exactly these files at this size
+        self.signature = {"version": CACHE_VERSION, "size": sprite_size,
+                          "sources": [[file_name, os.path.getsize(os.path.join(images_dir, file_name)),
+                                       os.stat(os.path.join(images_dir, file_name)).st_mtime_ns] for file_name in sources]}
+        if not self.is_cache_valid():
+            self.build_cache()
+
+    def get_index_path(self):
+        return os.path.join(self.cache_dir, f"atlas_{self.sprite_size}.json")
+
+    def get_page_path(self, page):
+        return os.path.join(self.cache_dir, f"atlas_{self.sprite_size}_{page}.png")
+
+    def is_cache_valid(self):
+        try:
+            with open(self.get_index_path()) as file:
+                return json.load(file) == self.signature
+        except (OSError, ValueError):
+            return False
+
+    # scale every source into its page and write the pages, pages stay in memory if the cache directory cannot be written
+    def build_cache(self):
+        size = self.sprite_size
+        for page in range(len(self.pages)):
+            surface = pygame.Surface((PAGE_SIZE * size, PAGE_SIZE * size), pygame.SRCALPHA)
+            for sprite_id in range(page * SPRITES_PER_PAGE, min((page + 1) * SPRITES_PER_PAGE, len(self.names))):
+                image = pygame.image.load(os.path.join(self.images_dir, self.names[sprite_id] + ".png"))
+                surface.blit(pygame.transform.scale(image, (size, size)), self.get_sprite_rect(sprite_id))
+            self.pages[page] = surface.convert_alpha()
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            for page, surface in enumerate(self.pages):
+                pygame.image.save(surface, self.get_page_path(page))
+            with open(self.get_index_path(), "w") as file:
+                json.dump(self.signature, file)
+        except (OSError, pygame.error):
+            return
+        self.pages = [None] * len(self.pages) # written, later lookups load only the pages they need
+
+    # where the sprite sits on its page
+    def get_sprite_rect(self, sprite_id):
+        row, col = divmod(sprite_id % SPRITES_PER_PAGE, PAGE_SIZE)
+        return pygame.Rect(col * self.sprite_size, row * self.sprite_size, self.sprite_size, self.sprite_size)
+
+    def get_sprite_id(self, name):
+        return self.ids[name]
+
+    # surface of a sprite id, a view into its page that shares the pixels
+    def get_sprite(self, sprite_id):
+        sprite = self.sprites[sprite_id]
+        if sprite is None:
+            page = sprite_id // SPRITES_PER_PAGE
+            if self.pages[page] is None:
+                self.pages[page] = pygame.image.load(self.get_page_path(page)).convert_alpha()
+            sprite = self.pages[page].subsurface(self.get_sprite_rect(sprite_id))
+            self.sprites[sprite_id] = sprite
+        return sprite
+
+    def __getitem__(self, name):
+        return self.get_sprite(self.ids[name])
@@ -1,10 +1,12 @@
 import pygame
 from rpg_chess.Data.constants import *
+from rpg_chess.View import assets
 
-def draw_game_state(screen, gs, valid_moves, square_selected):
-    draw_board(screen)  # draw squares
-    highlight_squares(screen, gs, valid_moves, square_selected)
-    draw_pieces(screen, gs.board)
+# Retained mode drawing: the board background is rendered once, every frame only the squares whose piece or highlight
+# changed are drawn again and only their rectangles are sent to the display
+
+def get_square_rect(row, col):
+    return pygame.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
 
 def draw_board(screen):
     # remainder 0 for white (brown), 1 for black (gray)
@@ -12,38 +14,86 @@ def draw_board(screen):
     for row in range(DIMENSION):
         for col in range(DIMENSION):
             color = colors[((row + col) % 2)]
-            pygame.draw.rect(screen, color, pygame.Rect(
-                col*SQUARE_SIZE, row*SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+            pygame.draw.rect(screen, color, get_square_rect(row, col))
 
-IMAGES = {}
-def load_images():
-    for piece in PIECE_NAMES:
-        IMAGES[piece] = pygame.transform.scale(pygame.image.load(f"images/{piece}.png"), (SQUARE_SIZE, SQUARE_SIZE))
+IMAGES = None # SpriteAtlas, IMAGES["wK"] is the sprite of a piece
+def load_images(): # after the display is set up, surfaces are converted to its pixel format
+    global IMAGES
+    IMAGES = assets.SpriteAtlas()
 
-def draw_pieces(screen, board):
-    for row in range(DIMENSION):
-        for col in range(DIMENSION):
-            piece = board[row][col]
-            if piece != "--":
-                screen.blit(IMAGES[piece], pygame.Rect(col*SQUARE_SIZE, row*SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+FONTS = {} # (name, size, bold, italic) -> font, creating a SysFont searches the system fonts every time
+def get_font(name = "Arial", size = 32, bold = True, italic = False):
+    key = (name, size, bold, italic)
+    if key not in FONTS:
+        FONTS[key] = pygame.font.SysFont(name, size, bold, italic)
+    return FONTS[key]
 
+# returns the rectangle that was drawn on
 def draw_text(screen, text):
-    font = pygame.font.SysFont("Arial", 32, True, False)
-    text_obj = font.render(text, 0, pygame.Color(BLACK))
+    text_obj = get_font().render(text, 0, pygame.Color(BLACK))
     text_location = pygame.Rect(0, 0, WIDTH, HEIGHT).move(WIDTH / 4.2 - text_obj.get_width() / 4.2, HEIGHT / 2 - text_obj.get_height() / 2)
-    screen.blit(text_obj, text_location)
+    return screen.blit(text_obj, text_location)
+
+HIGHLIGHT_COLORS = {"selected": BLUE, "move": GREEN}
+HIGHLIGHT_SURFACES = {} # one overlay per highlight kind, made on first use
+def get_highlight_surface(kind):
+    if kind not in HIGHLIGHT_SURFACES:
+        surface = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE))
+        surface.set_alpha(250) # transperancy value 0 for transperant to 255
+        surface.fill(pygame.Color(HIGHLIGHT_COLORS[kind]))
+        HIGHLIGHT_SURFACES[kind] = surface
+    return HIGHLIGHT_SURFACES[kind]
 
-def highlight_squares(screen, gs, valid_moves, square_selected):
+# (row, col) -> highlight kind: the selected piece of the player to move and the squares it can move to
+def get_highlights(gs, valid_moves, square_selected):
+    highlights = {}
     if square_selected != ():
         row, col = square_selected
         if gs.board[row][col][0] == ("w" if gs.white_to_move else "b"):
-            # highlight selected square
-            surface = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE))
-            surface.set_alpha(250) # transperancy value 0 for transperant to 255 
-            surface.fill(pygame.Color(BLUE))
-            screen.blit(surface, (col * SQUARE_SIZE, row * SQUARE_SIZE))
-            #highlight moves from figure in square
-            surface.fill(pygame.Color(GREEN))
-            for move in valid_moves:
-                if move.start_row == row and move.start_col == col:
-                    screen.blit(surface, (move.end_col * SQUARE_SIZE, move.end_row * SQUARE_SIZE))
\ No newline at end of file
+            highlights[square_selected] = "selected"
+            for move in valid_moves.get_moves_from(square_selected):
+                highlights[(move.end_row, move.end_col)] = "move"
+    return highlights
+
+class BoardRenderer:
+    def __init__(self, screen):
+        self.screen = screen
+        self.background = pygame.Surface((DIMENSION * SQUARE_SIZE, DIMENSION * SQUARE_SIZE)).convert()
+        draw_board(self.background)
+        self.drawn = [[None] * DIMENSION for _ in range(DIMENSION)] # (piece, highlight) on screen for every square
+        self.text = None
+        self.full_redraw = True
+
+    # next draw repaints the whole window, after it was covered by another window for example
+    def invalidate(self):
+        self.full_redraw = True
+
+    # draws what changed since the last call and returns the changed rectangles for pygame.display.update, empty if nothing changed
+    def draw(self, gs, valid_moves, square_selected, text = None):
+        if self.full_redraw or text != self.text: # a message appearing or going away lies over the board, so everything is repainted
+            self.screen.fill(pygame.Color("white"))
+            self.drawn = [[None] * DIMENSION for _ in range(DIMENSION)]
+            self.full_redraw = False
+            dirty = [self.screen.get_rect()]
+        else:
+            dirty = []
+        highlights = get_highlights(gs, valid_moves, square_selected)
+        for row in range(DIMENSION):
+            board_row = gs.board[row]
+            drawn_row = self.drawn[row]
+            for col in range(DIMENSION):
+                state = (board_row[col], highlights.get((row, col)))
+                if drawn_row[col] == state:
+                    continue
+                drawn_row[col] = state
+                rect = get_square_rect(row, col)
+                self.screen.blit(self.background, rect, rect)
+                if state[1] is not None:
+                    self.screen.blit(get_highlight_surface(state[1]), rect)
+                if state[0] != "--":
+                    self.screen.blit(IMAGES[state[0]], rect)
+                dirty.append(rect)
+        if text is not None and dirty:
+            dirty.append(draw_text(self.screen, text))
+        self.text = text
+        return dirty